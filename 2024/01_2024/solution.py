@@ -1,5 +1,11 @@
+import heapq
+import itertools
+import os
 import pytest
+import tempfile
+from array import array
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 def get_data(file_handle):
     sink = {"left": [], "right": [],}
@@ -12,6 +18,20 @@ def get_data(file_handle):
         sink["right"].append(line[-1])
     return sink
 
+def get_columns(file_handle):
+    # bulk parse: one read parsed straight into an int64 array, no int objects;
+    # numpy is only imported by the columnar helpers
+    import numpy as np
+
+    values = np.fromstring(file_handle.read(), dtype=np.int64, sep=' ')
+    if len(values) % 2 != 0:
+        raise ValueError(f"odd number of values in input: {len(values)}")
+    sink = {
+        "left": values[0::2],
+        "right": values[1::2],
+    }
+    return sink
+
 def _dist_fn(sink):
     sink["left"].sort()
     sink["right"].sort()
@@ -21,21 +41,209 @@ def _dist_fn(sink):
     ans = sum(sink["dists"])
     return ans
 
+def _dist_fn_columnar(sink):
+    import numpy as np
+
+    # sorts in place like _dist_fn (asarray wraps array('q') columns without
+    # copying), so the differences are the only int64 buffer allocated
+    left = np.asarray(sink["left"], dtype=np.int64)
+    right = np.asarray(sink["right"], dtype=np.int64)
+    left.sort()
+    right.sort()
+    dists = left - right
+    return int(np.abs(dists, out=dists).sum())
+
 def _simscore_fn(sink):
     ans = 0
-    rc = Counter(sink["right"])
+    rc = sink["right_counts"] if "right_counts" in sink else Counter(sink["right"])
     for n in set(sink["left"]):
         if n not in rc.keys():
             continue
         ans += n * rc[n]
     return ans
 
-def calculate(src, fn):
+def calculate(src, fn, loader=get_data):
     with open(src, 'r') as f:
-        data = get_data(f)
+        data = loader(f)
     ans = fn(data)
     return ans
 
+def _shard_offsets(src, shards):
+    # split into byte ranges whose boundaries sit just after a newline
+    size = os.path.getsize(src)
+    offsets = [0]
+    with open(src, 'rb') as f:
+        for n in range(1, shards):
+            target = max(offsets[-1], size * n // shards)
+            if target >= size:
+                break
+            f.seek(target)
+            f.readline()
+            if f.tell() >= size:
+                break
+            if f.tell() > offsets[-1]:
+                offsets.append(f.tell())
+    offsets.append(size)
+    return list(zip(offsets, offsets[1:]))
+
+def _parse_shard(args):
+    src, start, end = args
+    with open(src, 'rb') as f:
+        f.seek(start)
+        values = f.read(end - start).split()
+    left = array('q', map(int, values[0::2]))
+    right = array('q', map(int, values[1::2]))
+    return left, right, Counter(right)
+
+def get_data_sharded(src, workers=None, shards=None):
+    workers = workers or os.cpu_count()
+    ranges = _shard_offsets(src, shards or workers)
+    sink = {"left": array('q'), "right": array('q'), "right_counts": Counter()}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, so concatenation keeps file order
+        for left, right, counts in pool.map(_parse_shard, [(src, a, b) for a, b in ranges]):
+            sink["left"].extend(left)
+            sink["right"].extend(right)
+            sink["right_counts"].update(counts)
+    return sink
+
+def calculate_all(src, workers=None, shards=None):
+    data = get_data_sharded(src, workers, shards)
+    return _dist_fn_columnar(data), _simscore_fn(data)
+
+# out-of-core mode: sort bounded runs of each column, spill them to disk, then
+# merge the sorted runs back together. Each buffered value costs roughly this
+# many bytes while a run is being sorted (array slot + transient int object)
+_BYTES_PER_BUFFERED_VALUE = 48
+_ITEM_SIZE = array('q').itemsize
+
+def _spill_run(buf, tmpdir):
+    run = array('q', sorted(buf))
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, 'wb') as f:
+        run.tofile(f)
+    return path
+
+def _spill_runs(src, run_len, tmpdir):
+    left_runs, right_runs = [], []
+    left, right = array('q'), array('q')
+    with open(src, 'r') as f:
+        for line in f:
+            line = line.split()
+            if not line:
+                continue
+            left.append(int(line[0]))
+            right.append(int(line[-1]))
+            if len(left) >= run_len:
+                left_runs.append(_spill_run(left, tmpdir))
+                right_runs.append(_spill_run(right, tmpdir))
+                left, right = array('q'), array('q')
+    if left:
+        left_runs.append(_spill_run(left, tmpdir))
+        right_runs.append(_spill_run(right, tmpdir))
+    return left_runs, right_runs
+
+def _read_run(path, block_len):
+    with open(path, 'rb') as f:
+        while True:
+            block = array('q')
+            try:
+                block.fromfile(f, block_len)
+            except EOFError:
+                # a short read still appends whatever was there
+                yield from block
+                return
+            yield from block
+
+def _merged(runs, block_len):
+    return heapq.merge(*[_read_run(p, block_len) for p in runs])
+
+def _write_run(values, block_len, tmpdir):
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, 'wb') as f:
+        block = array('q')
+        for v in values:
+            block.append(v)
+            if len(block) >= block_len:
+                block.tofile(f)
+                block = array('q')
+        block.tofile(f)
+    return path
+
+def _merge_down(runs, fan_in, block_len, tmpdir):
+    # multi-level merge: collapse runs fan_in at a time until one pass can
+    # open them all, so block_len never has to shrink with the run count
+    while len(runs) > fan_in:
+        merged = []
+        for group in itertools.batched(runs, fan_in):
+            merged.append(_write_run(_merged(group, block_len), block_len, tmpdir))
+            for path in group:
+                os.remove(path)
+        runs = merged
+    return runs
+
+def _sweep(events):
+    """Return (sum of distances, similarity score) from one sorted stream
+
+    events are (value, +1) for left values and (value, -1) for right values.
+    With equal column lengths, the sum of |left_i - right_i| over the sorted
+    columns is the running left/right imbalance times the gap to the next
+    value, and each value group also gives the join term for _simscore_fn.
+    """
+    dist = simscore = 0
+    balance = 0
+    prev = None
+    in_left = False
+    right_count = 0
+    for value, side in events:
+        if value != prev:
+            if prev is not None:
+                if in_left:
+                    simscore += prev * right_count
+                dist += abs(balance) * (value - prev)
+            prev, in_left, right_count = value, False, 0
+        balance += side
+        if side > 0:
+            in_left = True
+        else:
+            right_count += 1
+    if in_left:
+        simscore += prev * right_count
+    return dist, simscore
+
+def calculate_external(src, mem_budget=64 * 2**20, tmpdir=None, fan_in=64):
+    """Return (sum of distances, similarity score) without loading the columns
+
+    Runs are sized so that both column buffers fit in mem_budget bytes. The
+    runs are merged at most fan_in per column at a time, reading in blocks
+    sized so that every open cursor fits in the same budget, and both
+    answers come out of a single final merge pass.
+    """
+    run_len = max(1, mem_budget // (2 * _BYTES_PER_BUFFERED_VALUE))
+    # merging one run at a time would never shrink the run count
+    fan_in = max(2, fan_in)
+    # the final pass holds fan_in cursors per column; intermediate passes
+    # hold fan_in cursors plus one output buffer
+    block_len = max(1, mem_budget // (2 * fan_in * _ITEM_SIZE))
+    with tempfile.TemporaryDirectory(dir=tmpdir) as workdir:
+        left_runs, right_runs = _spill_runs(src, run_len, workdir)
+        left_runs = _merge_down(left_runs, fan_in, block_len, workdir)
+        right_runs = _merge_down(right_runs, fan_in, block_len, workdir)
+        return _sweep(heapq.merge(
+            ((v, 1) for v in _merged(left_runs, block_len)),
+            ((v, -1) for v in _merged(right_runs, block_len)),
+        ))
+
+def parse(src):
+    with open(src, 'r') as f:
+        return get_columns(f)
+
+def part_one(sink):
+    return _dist_fn_columnar(sink)
+
+def part_two(sink):
+    return _simscore_fn(sink)
+
 if __name__ == "__main__":
     print(f"sum of distances: {calculate('data.txt', _dist_fn)}")
     print(f"similarity score: {calculate('data.txt', _simscore_fn)}")
@@ -80,3 +288,66 @@ def test_calculate_calculate_distance():
 def test_calculate_similarity_score_with_dit():
     n = calculate("test_data.txt", _simscore_fn)
     assert n == 12503
+
+def _write_columns(path, left, right):
+    with open(path, 'w') as f:
+        for l, r in zip(left, right):
+            f.write(f"{l}   {r}\n")
+
+def test_get_columns(tmp_path):
+    src = tmp_path / "cols.txt"
+    _write_columns(src, [15131,32438,12503], [78158,35057,57702])
+    with open(src, 'r') as f:
+        data = get_columns(f)
+    assert data["left"].dtype.name == "int64"
+    assert list(data["left"]) == [15131,32438,12503]
+    assert list(data["right"]) == [78158,35057,57702]
+
+def test_dist_fn_columnar_matches_dist_fn(tmp_path):
+    src = tmp_path / "cols.txt"
+    _write_columns(
+        src,
+        [15131,32438,12503,73808,57168,57168,],
+        [78158,35057,57702,43128,71761,57168,],
+    )
+    assert calculate(src, _dist_fn_columnar, get_columns) == calculate(src, _dist_fn)
+    assert calculate(src, _simscore_fn, get_columns) == calculate(src, _simscore_fn)
+
+def test_calculate_external_matches_in_memory(tmp_path):
+    src = tmp_path / "cols.txt"
+    left = [15131,57702,12503,73808,57168,98765,98765,12503,3,]
+    right = [78158,35057,57702,42908,71761,12503,57702,3,3,]
+    _write_columns(src, left, right)
+    # a tiny budget forces several single-value runs
+    dist, simscore = calculate_external(src, mem_budget=1, tmpdir=tmp_path)
+    assert dist == calculate(src, _dist_fn)
+    assert simscore == calculate(src, _simscore_fn)
+    assert calculate_external(src, tmpdir=tmp_path) == (dist, simscore)
+    # fan_in=2 forces several intermediate merge levels
+    assert calculate_external(src, mem_budget=1, tmpdir=tmp_path, fan_in=2) == (dist, simscore)
+    assert list(tmp_path.iterdir()) == [src]
+
+def test_shard_offsets_are_newline_aligned(tmp_path):
+    src = tmp_path / "cols.txt"
+    _write_columns(src, range(100, 120), range(200, 220))
+    ranges = _shard_offsets(src, 7)
+    raw = src.read_bytes()
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(raw)
+    for start, end in ranges:
+        assert start == 0 or raw[start - 1:start] == b"\n"
+        assert raw[start:end].endswith(b"\n")
+    assert _shard_offsets(src, 1000)[-1][1] == len(raw)
+
+def test_get_data_sharded_matches_serial(tmp_path):
+    src = tmp_path / "cols.txt"
+    left = [15131,57702,12503,73808,57168,98765,98765,12503,3,]
+    right = [78158,35057,57702,42908,71761,12503,57702,3,3,]
+    _write_columns(src, left, right)
+    data = get_data_sharded(src, workers=2, shards=4)
+    assert list(data["left"]) == left
+    assert list(data["right"]) == right
+    assert data["right_counts"] == Counter(right)
+    assert calculate_all(src, workers=2, shards=4) == (
+        calculate(src, _dist_fn), calculate(src, _simscore_fn),
+    )
@@ -1,3 +1,11 @@
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import batched, combinations
+from time import perf_counter
+
+
 def get_data(src):
     sink = []
     with open(src, "r") as f:
@@ -9,17 +17,18 @@ def get_data(src):
     return sink
 
 
-def _validate_exact(report) -> bool:
+def _validate_exact(report, max_step=3) -> bool:
     if not report:
         return False
     direction = True if report[0] - report[1] < 0 else False
     for n in range(len(report) - 1):
         step = report[n] - report[n + 1]
-        if (step == 0 or (step < 0) != direction or abs(step) > 3):
+        if (step == 0 or (step < 0) != direction or abs(step) > max_step):
             return False
     return True
 
-def _validate_tolerant(report) -> bool:
+def _validate_tolerant_bruteforce(report) -> bool:
+    # original O(n^2) version, kept as the reference for tests and benchmarks
     if _validate_exact(report):
         return True
     for i in range(len(report)):
@@ -29,6 +38,106 @@ def _validate_tolerant(report) -> bool:
             return True
     return False
 
+def _fits(report, increasing, k, max_step, start=1, removed=()):
+    """Return True if report can be made monotonic by dropping at most k levels
+
+    Walks forward until the first bad step between the last kept level (prev)
+    and level i. Any fix has to drop one of those two, so only those two
+    branches are tried, each with one less removal in hand. Dropped indices
+    are tracked in a small tuple instead of copying the report. That is
+    2^k scans at worst, so it is only used for small k.
+    """
+    for i in range(start, len(report)):
+        prev = i - 1
+        while prev in removed:
+            prev -= 1
+        if prev < 0:
+            continue
+        step = report[i] - report[prev] if increasing else report[prev] - report[i]
+        if not 0 < step <= max_step:
+            if k == 0:
+                return False
+            return (
+                _fits(report, increasing, k - 1, max_step, i + 1, removed + (i,))
+                or _fits(report, increasing, k - 1, max_step, i, removed + (prev,))
+            )
+    return True
+
+def _removals_needed(report, increasing, k, max_step):
+    """Return the fewest levels to drop so report steps one way, capped at k + 1
+
+    best[i] is the fewest removals that leave level i as the last kept one.
+    Everything up to the first bad step is kept for free, so the DP starts
+    there. Keeping j right before i drops the i - j - 1 levels in between, so
+    with at most k removals only the k + 1 levels before i are worth looking
+    at; deep inside a run of good steps best stops changing, and once k + 1
+    levels in a row are out of reach nothing later can be.
+    """
+    n = len(report)
+    over = k + 1
+    sign = 1 if increasing else -1
+    i = 1
+    while i < n and 0 < (report[i] - report[i - 1]) * sign <= max_step:
+        i += 1
+    if i == n:
+        return 0
+    best = [0] * i
+    misses = 0
+    # levels from run_start up to i - 1 step the right way one after another
+    run_start = i
+    while i < n:
+        level = report[i]
+        if not 0 < (level - report[i - 1]) * sign <= max_step:
+            run_start = i
+        elif run_start < i - k:
+            # the whole lookback is inside the run, so skip to the next bad step
+            j = i + 1
+            while j < n and 0 < (report[j] - report[j - 1]) * sign <= max_step:
+                j += 1
+            best.extend([best[-1]] * (j - i))
+            i = j
+            continue
+        # dropping everything before i
+        need = i if i <= k else over
+        for j in range(i - k - 1 if i > k else 0, i):
+            cost = best[j] + i - j - 1
+            if cost < need and 0 < (level - report[j]) * sign <= max_step:
+                need = cost
+        best.append(need)
+        if need > k:
+            misses += 1
+            if misses > k:
+                return over
+        else:
+            misses = 0
+        i += 1
+    # the levels after the last kept one are dropped too
+    need = over
+    for i in range(max(0, n - k - 1), n):
+        if best[i] + n - 1 - i < need:
+            need = best[i] + n - 1 - i
+    return need
+
+# up to this many removals, branching at each bad step beats the DP
+_BRANCH_MAX_K = 2
+
+def _validate_tolerant(report, k=1, max_step=3) -> bool:
+    if not report:
+        return False
+    if len(report) > 1 and _validate_exact(report, max_step):
+        return True
+    # the first step is usually the right direction, so try it first
+    increasing = len(report) > 1 and report[1] > report[0]
+    if k <= _BRANCH_MAX_K:
+        return (
+            _fits(report, increasing, k, max_step)
+            or _fits(report, not increasing, k, max_step)
+        )
+    return (
+        _removals_needed(report, increasing, k, max_step) <= k
+        or _removals_needed(report, not increasing, k, max_step) <= k
+    )
+
 def safety_check(src, fn):
     sink = get_data(src)
     safe_count = 0
@@ -37,9 +146,146 @@ def safety_check(src, fn):
             safe_count += 1
     return safe_count
 
+def _pack_reports(sink):
+    # ragged reports -> zero-padded (n, max_len) matrix plus a length vector;
+    # numpy is imported by the batch helpers only, the scalar path runs without it
+    import numpy as np
+
+    lengths = np.fromiter((len(r) for r in sink), dtype=np.int64, count=len(sink))
+    width = int(lengths.max()) if len(sink) else 0
+    matrix = np.zeros((len(sink), width), dtype=np.int64)
+    mask = np.arange(width) < lengths[:, None]
+    matrix[mask] = np.fromiter(
+        (n for r in sink for n in r), dtype=np.int64, count=int(lengths.sum()),
+    )
+    return matrix, lengths
+
+def _steps_ok(matrix, lengths, max_step):
+    import numpy as np
+
+    # per-pair verdicts for both directions; padding pairs count as fine
+    diffs = np.diff(matrix, axis=1)
+    padding = np.arange(diffs.shape[1]) >= (lengths - 1)[:, None]
+    inc = ((diffs >= 1) & (diffs <= max_step)) | padding
+    dec = ((diffs <= -1) & (diffs >= -max_step)) | padding
+    return inc, dec
+
+def _validate_exact_batch(matrix, lengths, max_step=3):
+    inc, dec = _steps_ok(matrix, lengths, max_step)
+    return (inc.all(axis=1) | dec.all(axis=1)) & (lengths > 0)
+
+def _tolerant_one_direction(matrix, lengths, ok, sign, max_step):
+    import numpy as np
+
+    n, width = matrix.shape
+    pairs = width - 1
+    # all_before[:, p] is True when pairs 0..p-1 are fine,
+    # all_after[:, p] when pairs p..pairs-1 are fine
+    all_before = np.ones((n, pairs + 1), dtype=bool)
+    all_before[:, 1:] = np.logical_and.accumulate(ok, axis=1)
+    all_after = np.ones((n, pairs + 1), dtype=bool)
+    all_after[:, :-1] = np.logical_and.accumulate(ok[:, ::-1], axis=1)[:, ::-1]
+    safe = np.zeros(n, dtype=bool)
+    for j in range(width):
+        # dropping level j removes pairs j-1 and j and bridges j-1 -> j+1
+        before = all_before[:, max(j - 1, 0)]
+        after = all_after[:, min(j + 1, pairs)]
+        if 0 < j < width - 1:
+            step = (matrix[:, j + 1] - matrix[:, j - 1]) * sign
+            bridge = ((step >= 1) & (step <= max_step)) | (j + 1 >= lengths)
+        else:
+            bridge = True
+        safe |= before & after & bridge & (j < lengths)
+    return safe
+
+def _validate_tolerant_batch(matrix, lengths, max_step=3):
+    if matrix.shape[1] < 2:
+        return lengths > 0
+    inc, dec = _steps_ok(matrix, lengths, max_step)
+    return (
+        _tolerant_one_direction(matrix, lengths, inc, 1, max_step)
+        | _tolerant_one_direction(matrix, lengths, dec, -1, max_step)
+    )
+
+def safety_check_batch(src, tolerant=False, max_step=3):
+    matrix, lengths = _pack_reports(get_data(src))
+    fn = _validate_tolerant_batch if tolerant else _validate_exact_batch
+    return int(fn(matrix, lengths, max_step).sum())
+
+def _count_batch(lines):
+    # parse + validate one batch of raw lines; returns (exact, tolerant) counts
+    exact = tolerant = 0
+    for line in lines:
+        report = [int(n) for n in line.split()]
+        if _validate_exact(report):
+            exact += 1
+            tolerant += 1
+        elif _validate_tolerant(report):
+            tolerant += 1
+    return exact, tolerant
+
+def _batch_counts(src, batch_size, workers):
+    with open(src, "r") as f:
+        batches = batched(f, batch_size)
+        if not workers:
+            yield from map(_count_batch, batches)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # cap the batches in flight so memory stays bounded by batch_size
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(_count_batch, batch))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+def safety_check_streaming(src, batch_size=4096, workers=None):
+    """Return (exact, tolerant) safe counts from a single pass over src"""
+    exact = tolerant = 0
+    for e, t in _batch_counts(src, batch_size, workers):
+        exact += e
+        tolerant += t
+    return exact, tolerant
+
+def _make_long_reports(count, length, seed=0):
+    # mostly-safe increasing reports with one bad level near the end, which
+    # is the worst case for the remove-and-retry approach
+    rng = random.Random(seed)
+    reports = []
+    for _ in range(count):
+        report = [0]
+        for _ in range(length - 2):
+            report.append(report[-1] + rng.randint(1, 3))
+        report.insert(-1, report[-2] + 10)
+        reports.append(report)
+    return reports
+
+def _benchmark_tolerant(count=50, length=1000):
+    reports = _make_long_reports(count, length)
+    for name, fn in (
+        ("bruteforce", _validate_tolerant_bruteforce),
+        ("first bad", _validate_tolerant),
+    ):
+        t0 = perf_counter()
+        safe = sum(1 for report in reports if fn(report))
+        print(f"{name:<12}: {perf_counter() - t0:8.4f}s ({safe}/{count} safe)")
+
+def parse(src):
+    return get_data(src)
+
+def part_one(sink):
+    return sum(1 for report in sink if _validate_exact(report))
+
+def part_two(sink):
+    return sum(1 for report in sink if _validate_tolerant(report))
+
 if __name__ == "__main__":
-    print(f"safe reports no tolerance  : {safety_check("data.txt", _validate_exact)}")
-    print(f"safe reports with tolerance: {safety_check("data.txt", _validate_tolerant)}")
+    if sys.argv[1:2] == ["bench"]:
+        _benchmark_tolerant()
+    else:
+        print(f"safe reports no tolerance  : {safety_check("data.txt", _validate_exact)}")
+        print(f"safe reports with tolerance: {safety_check("data.txt", _validate_tolerant)}")
 
 
 
@@ -73,3 +319,94 @@ def test_validate_with_tolerance():
 def test_safety_check():
     ans = safety_check("test_data.txt", _validate_exact)
     assert ans == 1
+
+def test_validate_tolerant_matches_bruteforce():
+    rng = random.Random(2)
+    for _ in range(2000):
+        start = rng.randint(1, 20)
+        report = [start + rng.randint(-4, 4) * i for i in range(rng.randint(3, 8))]
+        for i in range(len(report)):
+            if rng.random() < 0.3:
+                report[i] += rng.randint(-5, 5)
+        assert _validate_tolerant(report) == _validate_tolerant_bruteforce(report), report
+
+def test_validate_tolerant_params():
+    assert not _validate_tolerant([1,3,5,4,7,], k=0)
+    assert _validate_tolerant([1,3,5,6,7,], k=0)
+    assert not _validate_tolerant([1,2,9,3,8,4,], k=1)
+    assert _validate_tolerant([1,2,9,3,8,4,], k=2)
+    assert not _validate_tolerant([1,5,9,13,], max_step=3)
+    assert _validate_tolerant([1,5,9,13,], max_step=4)
+    assert _validate_tolerant([1,5,9,10,15,], max_step=4)
+
+def test_validate_tolerant_any_k():
+    def _reference(report, k):
+        # try every way of dropping up to k levels
+        # a single remaining level counts as monotonic
+        return any(
+            len(report) - r == 1
+            or _validate_exact([n for i, n in enumerate(report) if i not in dropped])
+            for r in range(min(k, len(report) - 1) + 1)
+            for dropped in combinations(range(len(report)), r)
+        )
+    rng = random.Random(4)
+    for _ in range(1000):
+        report = [rng.randint(1, 12) for _ in range(rng.randint(3, 9))]
+        k = rng.randint(0, 5)
+        assert _validate_tolerant(report, k=k) == _reference(report, k), (report, k)
+    # alternating levels used to branch twice at every bad step; only one
+    # level can survive, so it takes 79 removals
+    assert _validate_tolerant([1, 10] * 40, k=79)
+    assert not _validate_tolerant([1, 10] * 40, k=78)
+
+def test_validate_tolerant_long_reports():
+    for report in _make_long_reports(3, 500):
+        assert _validate_tolerant(report)
+        assert not _validate_tolerant(report, k=0)
+        assert _validate_tolerant(report, k=_BRANCH_MAX_K + 1)
+
+def test_pack_reports():
+    matrix, lengths = _pack_reports([[1,2,3], [4], [5,6]])
+    assert matrix.tolist() == [[1,2,3], [4,0,0], [5,6,0]]
+    assert lengths.tolist() == [3, 1, 2]
+
+def test_validate_batch_matches_scalar():
+    rng = random.Random(3)
+    sink = []
+    for _ in range(2000):
+        start = rng.randint(1, 20)
+        report = [start + rng.randint(-4, 4) * i for i in range(rng.randint(3, 8))]
+        for i in range(len(report)):
+            if rng.random() < 0.3:
+                report[i] += rng.randint(-5, 5)
+        sink.append(report)
+    matrix, lengths = _pack_reports(sink)
+    exact = _validate_exact_batch(matrix, lengths)
+    tolerant = _validate_tolerant_batch(matrix, lengths)
+    assert exact.tolist() == [_validate_exact(r) for r in sink]
+    assert tolerant.tolist() == [_validate_tolerant(r) for r in sink]
+
+_sample_data = """\
+7 6 4 2 1
+1 2 7 8 9
+9 7 6 2 1
+1 3 2 4 5
+8 6 4 4 1
+1 3 6 7 9
+"""
+
+def test_safety_check_batch(tmp_path):
+    src = tmp_path / "reports.txt"
+    src.write_text(_sample_data)
+    assert safety_check_batch(src) == safety_check(src, _validate_exact) == 2
+    assert safety_check_batch(src, tolerant=True) == safety_check(src, _validate_tolerant) == 4
+
+def test_safety_check_streaming(tmp_path):
+    src = tmp_path / "reports.txt"
+    src.write_text(_sample_data)
+    expected = (
+        safety_check(src, _validate_exact), safety_check(src, _validate_tolerant),
+    )
+    assert safety_check_streaming(src) == expected == (2, 4)
+    assert safety_check_streaming(src, batch_size=1) == expected
+    assert safety_check_streaming(src, batch_size=2, workers=2) == expected
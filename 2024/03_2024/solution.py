@@ -1,11 +1,44 @@
+import mmap
+import os
 import re
 import pytest
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 mul_pattern = re.compile(r"mul\((\d+),(\d+)\)")
 cond_mul_pattern = re.compile(r"(?:\A|do\(\))[\s\S]*?(?:don't\(\)|\Z)")
 # tricky: [\s\S] matches everything _and_ line terminators, whereas the
 # dot <.> matches everything _except_ line terminators
 
+# instruction set for the tokenizer: kind -> pattern. Argument groups are named
+# <kind>__<arg> so that tokens can pick up their arguments in order; add a new
+# entry here (or pass your own compiled set to tokenize) for new instructions
+instructions = {
+    "mul": r"mul\((?P<mul__a>\d+),(?P<mul__b>\d+)\)",
+    "do": r"do\(\)",
+    "dont": r"don't\(\)",
+}
+
+Token = namedtuple("Token", ["kind", "args", "start"])
+
+def _compile_instructions(specs):
+    pattern = re.compile("|".join(f"(?P<{kind}>{body})" for kind, body in specs.items()))
+    groups = sorted(pattern.groupindex, key=pattern.groupindex.get)
+    arg_groups = {
+        kind: tuple(g for g in groups if g.startswith(f"{kind}__")) for kind in specs
+    }
+    return pattern, arg_groups
+
+instr_pattern, instr_arg_groups = _compile_instructions(instructions)
+
+# byte-level patterns for the chunked scanner. The partial pattern matches an
+# instruction that has been cut off by the end of a chunk; it is anchored at
+# \Z so search() finds the earliest such start
+instr_pattern_b = re.compile(rb"mul\((\d+),(\d+)\)|do\(\)|don't\(\)")
+partial_instr_pattern_b = re.compile(
+    rb"(?:mul\(\d+,\d*|mul\(\d*|mul|mu|m|don't\(|don't|don'|don|do\(|do|d)\Z"
+)
+
 def _get_data(src):
     with open(src, 'r') as f:
         sink = f.read()
@@ -18,18 +51,144 @@ def _sum_multiplies(sink):
         ans += int(item.group(1)) * int(item.group(2))
     return ans
 
+def tokenize(sink, pos=0, stop=None, compiled=(instr_pattern, instr_arg_groups)):
+    """Yield a Token for every instruction in sink, in order
+
+    Scanning starts at pos; tokens starting at or after stop are not emitted
+    (a token starting before stop may still run past it).
+    """
+    pattern, arg_groups = compiled
+    for item in pattern.finditer(sink, pos):
+        if stop is not None and item.start() >= stop:
+            return
+        kind = item.lastgroup
+        yield Token(kind, tuple(int(item.group(g)) for g in arg_groups[kind]), item.start())
+
+def _sum_both(sink):
+    # (all multiplies, enabled multiplies) from a single pass over the tokens
+    total = valid_total = 0
+    enabled = True
+    for token in tokenize(sink):
+        match token.kind:
+            case "mul":
+                product = token.args[0] * token.args[1]
+                total += product
+                if enabled:
+                    valid_total += product
+            case "do":
+                enabled = True
+            case "dont":
+                enabled = False
+    return (total, valid_total)
+
 def _sum_valid_multiplies(sink):
-    ans = 0
-    valid_domains = re.finditer(cond_mul_pattern, sink)
-    for block in iter(valid_domains):
-        ans += _sum_multiplies(block.group())
-    return ans
+    return _sum_both(sink)[1]
+
+def _scan_mmap(src, chunk_size=1 << 20):
+    """Return (sum of multiplies, sum of valid multiplies) for src
+
+    The file is mapped and scanned chunk_size bytes at a time. Whatever might
+    be the start of an unfinished instruction at the end of a chunk is
+    carried into the next one, and the do()/don't() state is carried along
+    with the running totals.
+    """
+    total = valid_total = 0
+    enabled = True
+    with open(src, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return (0, 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            carry = b""
+            for offset in range(0, size, chunk_size):
+                buf = carry + mm[offset:offset + chunk_size]
+                end = 0
+                for item in instr_pattern_b.finditer(buf):
+                    end = item.end()
+                    token = item.group()
+                    if token == b"do()":
+                        enabled = True
+                    elif token == b"don't()":
+                        enabled = False
+                    else:
+                        product = int(item.group(1)) * int(item.group(2))
+                        total += product
+                        if enabled:
+                            valid_total += product
+                partial = partial_instr_pattern_b.search(buf, end)
+                carry = buf[partial.start():] if partial else b""
+    return (total, valid_total)
+
+def _summarize_chunk(job):
+    """Return (total, sum if entered enabled, sum if entered disabled, exit state)
+
+    exit state is None when the chunk has no do()/don't(), i.e. it leaves the
+    state as it found it.
+    """
+    text, stop = job
+    total = if_enabled = if_disabled = 0
+    exit_state = None
+    for token in tokenize(text, stop=stop):
+        match token.kind:
+            case "mul":
+                product = token.args[0] * token.args[1]
+                total += product
+                if exit_state is None:
+                    if_enabled += product
+                elif exit_state:
+                    if_enabled += product
+                    if_disabled += product
+            case "do":
+                exit_state = True
+            case "dont":
+                exit_state = False
+    return (total, if_enabled, if_disabled, exit_state)
+
+def _split_chunks(sink, chunks):
+    # every chunk owns the tokens that start inside it; its slice runs on to
+    # the next ')' so that a token straddling the boundary is still whole
+    size = max(1, -(-len(sink) // chunks))
+    jobs = []
+    for start in range(0, len(sink), size):
+        stop = min(start + size, len(sink))
+        close = sink.find(")", stop)
+        end = len(sink) if close == -1 else close + 1
+        jobs.append((sink[start:end], stop - start))
+    return jobs
+
+def compute_parallel(src, workers=None, chunks=None):
+    """Return (sum of multiplies, sum of valid multiplies) using a process pool
+
+    Each chunk is summarised for both possible entry states; a sequential
+    pass over the summaries then picks the right sum for each chunk.
+    """
+    sink = _get_data(src)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        summaries = pool.map(_summarize_chunk, _split_chunks(sink, chunks or workers))
+        total = valid_total = 0
+        enabled = True
+        for chunk_total, if_enabled, if_disabled, exit_state in summaries:
+            total += chunk_total
+            valid_total += if_enabled if enabled else if_disabled
+            if exit_state is not None:
+                enabled = exit_state
+    return (total, valid_total)
 
 
 def compute(src, fn):
     sink = _get_data(src)
     return fn(sink)
 
+def parse(src):
+    return _get_data(src)
+
+def part_one(sink):
+    return _sum_multiplies(sink)
+
+def part_two(sink):
+    return _sum_valid_multiplies(sink)
+
 def main():
     print(f"sum of multiplies: {compute("data.txt", _sum_multiplies)}")
     print(f"sum of multiplies: {compute("data.txt", _sum_valid_multiplies)}")
@@ -102,3 +261,59 @@ def test_sum_all_multiplies():
 def test_sum_valid_multiplies():
     sink = _get_data("test_data.txt")
     assert _sum_valid_multiplies(sink) == 1836940
+
+_sample_data = """\
+xmul(2,4)&mul[3,7]!^don't()_mul(5,5)+mul(32,64](mul(11,8)undo()?mul(8,5))
+do()860)[mul(886,453))mul(168,7)
+oipqwnrgdon't()linwgrmul(32,4)0923utgh
+9835qhguhtmul(xy,9)do()lnvq3p9845mul(987,2)284h
+"""
+
+def test_scan_mmap_matches_regex_functions(tmp_path):
+    src = tmp_path / "dump.txt"
+    src.write_text(_sample_data)
+    sink = _get_data(src)
+    expected = (_sum_multiplies(sink), _sum_valid_multiplies(sink))
+    # every chunk size from 1 byte upwards splits instructions somewhere
+    for chunk_size in list(range(1, 20)) + [mmap.PAGESIZE]:
+        assert _scan_mmap(src, chunk_size) == expected
+
+def test_scan_mmap_empty_file(tmp_path):
+    src = tmp_path / "empty.txt"
+    src.write_text("")
+    assert _scan_mmap(src) == (0, 0)
+
+def test_tokenize():
+    tokens = list(tokenize("xmul(2,4)&don't()_mul(5,5)+undo()?mul(8,5))"))
+    assert [t.kind for t in tokens] == ["mul", "dont", "mul", "do", "mul"]
+    assert tokens[0] == Token("mul", (2, 4), 1)
+    assert tokens[3].args == ()
+    assert [t.kind for t in tokenize("mul(1,2)do()mul(3,4)", pos=1, stop=12)] == ["do"]
+
+def test_tokenize_custom_instructions():
+    compiled = _compile_instructions({**instructions, "add": r"add\((?P<add__a>\d+),(?P<add__b>\d+)\)"})
+    tokens = list(tokenize("add(1,2)mul(3,4)", compiled=compiled))
+    assert tokens == [Token("add", (1, 2), 0), Token("mul", (3, 4), 8)]
+
+def test_sum_both_matches_nested_regex():
+    test_str = (
+        "do()860)[mul(886,453))mul(168,7)"
+        "oipqwnrgdon't()linwgrmul(32,4)0923utgh"
+        "9835qhguhtmul(xy,9)do()lnvq3p9845mul(987,2)284h"
+    )
+    nested = 0
+    for block in re.finditer(cond_mul_pattern, test_str):
+        nested += _sum_multiplies(block.group())
+    assert _sum_both(test_str) == (_sum_multiplies(test_str), nested)
+
+def test_summarize_chunk():
+    assert _summarize_chunk(("mul(2,3)don't()mul(5,5)do()mul(1,1)", 100)) == (32, 7, 1, True)
+    assert _summarize_chunk(("mul(2,3)", 100)) == (6, 6, 0, None)
+    assert _summarize_chunk(("mul(2,3)mul(4,4)", 3)) == (6, 6, 0, None)
+
+def test_compute_parallel_matches_serial(tmp_path):
+    src = tmp_path / "dump.txt"
+    src.write_text(_sample_data)
+    expected = (compute(src, _sum_multiplies), compute(src, _sum_valid_multiplies))
+    for chunks in (1, 3, 17, 64):
+        assert compute_parallel(src, workers=2, chunks=chunks) == expected
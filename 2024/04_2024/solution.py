@@ -1,3 +1,11 @@
+import mmap
+import os
+import pickle
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
 def _right(word, board, row, col, rmx, cmx, wln):
     if not cmx - col >= wln:
         return 0
@@ -110,15 +118,362 @@ def _check_single(word, board, row, col):
         x_count += dir_fn(word, board, row, col, rmx, cmx, wln)
     return x_count
 
-def _wc(board, word, fn, idx):
+def _wc(board, word, fn, idx, rows=None):
     counter = 0
-    for row in range(len(board)):
+    if rows is None:
+        rows = range(len(board))
+    for row in rows:
         for col in range(len(board[row])):
             if board[row][col] == word[idx]:
                 xcount = fn(word, board, row, col)
                 counter += xcount
     return counter
 
+def _build_automaton(words):
+    # Aho-Corasick: trie transitions, failure links, and per-node lists of
+    # the word indices that end there (including via failure links)
+    goto = [{}]
+    fail = [0]
+    out = [[]]
+    for wi, word in enumerate(words):
+        if not word:
+            raise ValueError("cannot search for an empty word")
+        node = 0
+        for ch in word:
+            nxt = goto[node].get(ch)
+            if nxt is None:
+                nxt = len(goto)
+                goto[node][ch] = nxt
+                goto.append({})
+                fail.append(0)
+                out.append([])
+            node = nxt
+        out[node].append(wi)
+    queue = deque(goto[0].values())
+    while queue:
+        node = queue.popleft()
+        for ch, nxt in goto[node].items():
+            queue.append(nxt)
+            f = fail[node]
+            while f and ch not in goto[f]:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] = out[nxt] + out[fail[nxt]]
+    return goto, fail, out
+
+def _scan_line(automaton, line, counts):
+    goto, fail, out = automaton
+    node = 0
+    for ch in line:
+        while node and ch not in goto[node]:
+            node = fail[node]
+        node = goto[node].get(ch, 0)
+        for wi in out[node]:
+            counts[wi] += 1
+
+def _board_segments(board):
+    # every row, column, diagonal and anti-diagonal, read forwards, as
+    # (first row, first col, row step, col step, line)
+    rmx = len(board)
+    cmx = len(board[0]) if board else 0
+    for row in range(rmx):
+        yield (row, 0, 0, 1, board[row])
+    for col in range(cmx):
+        yield (0, col, 1, 0, "".join(board[row][col] for row in range(rmx)))
+    for d in range(-(rmx - 1), cmx):
+        rows = range(max(0, -d), min(rmx, cmx - d))
+        yield (rows[0], rows[0] + d, 1, 1, "".join(board[row][row + d] for row in rows))
+    for d in range(rmx + cmx - 1):
+        rows = range(max(0, d - cmx + 1), min(rmx, d + 1))
+        yield (rows[0], d - rows[0], 1, -1, "".join(board[row][d - row] for row in rows))
+
+def _board_lines(board):
+    for *_, line in _board_segments(board):
+        yield line
+
+def multi_word_count(board, words):
+    """Count every word in all eight directions with one automaton pass
+
+    Gives the same count per word as _wc(board, word, _check_single, 0).
+    """
+    words = list(dict.fromkeys(words))
+    automaton = _build_automaton(words)
+    counts = [0] * len(words)
+    for line in _board_lines(board):
+        _scan_line(automaton, line, counts)
+        _scan_line(automaton, line[::-1], counts)
+    return dict(zip(words, counts))
+
+def _to_array(board):
+    # numpy is imported by the vectorized kernels only, so word_count and
+    # the scalar checks run without it
+    import numpy as np
+
+    return np.frombuffer("".join(board).encode("ascii"), dtype=np.uint8).reshape(len(board), -1)
+
+def _arm_window(shape, n, dr, dc):
+    # row/col slice bounds of the cells from which n steps of (dr, dc) stay on the board
+    rmx, cmx = shape
+    r_lo, c_lo = max(0, -n * dr), max(0, -n * dc)
+    r_hi = max(r_lo, rmx - max(0, n * dr))
+    c_hi = max(c_lo, cmx - max(0, n * dc))
+    return (r_lo, r_hi, c_lo, c_hi)
+
+def _arm_match(arr, arm, dr, dc):
+    """Return (window, mask) where mask marks the window cells that have arm
+    spelled out in direction (dr, dc), starting one step away."""
+    import numpy as np
+
+    r_lo, r_hi, c_lo, c_hi = _arm_window(arr.shape, len(arm), dr, dc)
+    mask = np.ones((r_hi - r_lo, c_hi - c_lo), dtype=bool)
+    if mask.size:
+        for k, ch in enumerate(arm, 1):
+            mask &= arr[r_lo + k*dr:r_hi + k*dr, c_lo + k*dc:c_hi + k*dc] == ord(ch)
+    return (r_lo, r_hi, c_lo, c_hi), mask
+
+def _arm_mask(arr, arm, dr, dc):
+    # full-board version of _arm_match; cells too close to the edge are False
+    import numpy as np
+
+    (r_lo, r_hi, c_lo, c_hi), mask = _arm_match(arr, arm, dr, dc)
+    full = np.zeros(arr.shape, dtype=bool)
+    full[r_lo:r_hi, c_lo:c_hi] = mask
+    return full
+
+_deltas = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+def _np_single(arr, word, idx):
+    import numpy as np
+
+    start = arr == ord(word[idx])
+    count = 0
+    for dr, dc in _deltas:
+        (r_lo, r_hi, c_lo, c_hi), mask = _arm_match(arr, word[1:], dr, dc)
+        count += int(np.count_nonzero(start[r_lo:r_hi, c_lo:c_hi] & mask))
+    return count
+
+def _np_cross(arr, word, idx):
+    import numpy as np
+
+    wln = (len(word)//2)+1
+    prefix = word[:wln][::-1]
+    postfix = word[wln*-1:]
+    pivot = arr == ord(word[idx])
+    # same precedence as _check_candidates: an upper branch reading prefix
+    # settles what the lower branch has to be before postfix is tried
+    branches = []
+    for (udr, udc), (ldr, ldc) in (((-1, -1), (1, 1)), ((-1, 1), (1, -1))):
+        upper_pre = _arm_mask(arr, prefix[1:], udr, udc)
+        upper_post = _arm_mask(arr, postfix[1:], udr, udc)
+        lower_pre = _arm_mask(arr, prefix[1:], ldr, ldc)
+        lower_post = _arm_mask(arr, postfix[1:], ldr, ldc)
+        branches.append(np.where(upper_pre, lower_post, upper_post & lower_pre))
+    return int(np.count_nonzero(pivot & branches[0] & branches[1]))
+
+_np_kernels = {
+    _check_single: _np_single,
+    _check_cross: _np_cross,
+}
+
+def _wc_numpy(board, word, fn, idx):
+    # drop-in for _wc: fn picks the matching vectorized kernel
+    return _np_kernels[fn](_to_array(board), word, idx)
+
+def word_count_numpy(src, word, fn, idx):
+    board = _get_data(src)
+    return _wc_numpy(board, word, fn, idx)
+
+class BoardIndex:
+    """Every line of a board (rows, columns, both diagonal families) joined
+    into one string, so repeated queries are plain str.find scans.
+
+    Lines are separated by newlines so no match can run from one line into
+    the next; starts/origins map a string offset back to its line and from
+    there to a (row, col) on the board.
+    """
+
+    _sep = "\n"
+
+    def __init__(self, board):
+        parts = []
+        self.starts = []
+        self.origins = []
+        offset = 0
+        for r0, c0, dr, dc, line in _board_segments(board):
+            self.starts.append(offset)
+            self.origins.append((r0, c0, dr, dc))
+            parts.append(line)
+            offset += len(line) + len(self._sep)
+        self.text = self._sep.join(parts)
+        self.shape = (len(board), len(board[0]) if board else 0)
+
+    @classmethod
+    def from_file(cls, src):
+        return cls(_get_data(src))
+
+    def _offsets(self, word):
+        # overlapping matches: restart one past each hit
+        find = self.text.find
+        at = find(word)
+        while at != -1:
+            yield at
+            at = find(word, at + 1)
+
+    def _cell(self, offset):
+        line = bisect_right(self.starts, offset) - 1
+        r0, c0, dr, dc = self.origins[line]
+        k = offset - self.starts[line]
+        return (r0 + k*dr, c0 + k*dc, dr, dc)
+
+    def count(self, word):
+        # forward hits plus reversed hits, i.e. all eight directions
+        if not word:
+            raise ValueError("cannot search for an empty word")
+        return (
+            sum(1 for _ in self._offsets(word))
+            + sum(1 for _ in self._offsets(word[::-1]))
+        )
+
+    def positions(self, word):
+        """Return (row, col, row step, col step) for every occurrence of word,
+        giving the cell of its first letter and the direction it reads in"""
+        if not word:
+            raise ValueError("cannot search for an empty word")
+        found = [self._cell(at) for at in self._offsets(word)]
+        for at in self._offsets(word[::-1]):
+            row, col, dr, dc = self._cell(at + len(word) - 1)
+            found.append((row, col, -dr, -dc))
+        return found
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            index = pickle.load(f)
+        if not isinstance(index, cls):
+            raise TypeError(f"{path} does not hold a {cls.__name__}")
+        return index
+
+def _grid_layout(mm):
+    # (cols, bytes per row including the line ending, rows) of a mapped grid
+    size = len(mm)
+    end = mm.find(b"\n")
+    if end == -1:
+        return (size, size, 1)
+    stride = end + 1
+    cols = end - 1 if end and mm[end - 1:end] == b"\r" else end
+    return (cols, stride, -(-size // stride))
+
+def _count_band(job):
+    # count the matches anchored in rows [r0, r1), reading halo extra rows
+    # either side so that matches crossing the band edge are still seen
+    src, r0, r1, halo, word, fn, idx = job
+    with open(src, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cols, stride, rows = _grid_layout(mm)
+            lo = max(0, r0 - halo)
+            hi = min(rows, r1 + halo)
+            board = [mm[r*stride:r*stride + cols].decode() for r in range(lo, hi)]
+    return _wc(board, word, fn, idx, rows=range(r0 - lo, r1 - lo))
+
+def word_count_tiled(src, word, fn, idx, band_rows=1024, workers=None):
+    """Count word over a grid file in row bands, one band per worker task
+
+    Every match is counted by the band that owns its anchor cell (the cell
+    _wc would call fn on), so matches in the overlapping halos are never
+    counted twice. A worker holds at most band_rows + 2*halo rows.
+    """
+    if os.path.getsize(src) == 0:
+        return 0
+    with open(src, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _, _, rows = _grid_layout(mm)
+    halo = len(word) - 1
+    jobs = [
+        (src, r0, min(r0 + band_rows, rows), halo, word, fn, idx)
+        for r0 in range(0, rows, band_rows)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_count_band, jobs))
+
+def _stencil_variants(rows, rotations, reflections):
+    variants = [rows]
+    if reflections:
+        variants.append(tuple(row[::-1] for row in rows))
+    if rotations:
+        for grid in list(variants):
+            for _ in range(3):
+                grid = tuple("".join(col) for col in zip(*grid[::-1]))
+                variants.append(grid)
+    return variants
+
+def compile_stencil(rows, rotations=True, reflections=True, wildcard='.'):
+    """Compile a 2D stencil into a tuple of (height, width, cells) tables
+
+    cells holds (row offset, col offset, letter) for every non-wildcard cell.
+    Each rotation/reflection becomes its own table, and variants that end up
+    covering the same cells with the same letters are only kept once.
+    """
+    cmx = max(len(row) for row in rows)
+    rows = tuple(row.ljust(cmx, wildcard) for row in rows)
+    tables = {}
+    for grid in _stencil_variants(rows, rotations, reflections):
+        cells = [
+            (r, c, ch)
+            for r, row in enumerate(grid)
+            for c, ch in enumerate(row)
+            if ch != wildcard
+        ]
+        if not cells:
+            raise ValueError("stencil has no letters")
+        r_min = min(r for r, _, _ in cells)
+        c_min = min(c for _, c, _ in cells)
+        cells = tuple((r - r_min, c - c_min, ch) for r, c, ch in cells)
+        height = max(r for r, _, _ in cells) + 1
+        width = max(c for _, c, _ in cells) + 1
+        tables.setdefault(cells, (height, width, cells))
+    return tuple(tables.values())
+
+x_mas_stencil = compile_stencil((
+    "M.S",
+    ".A.",
+    "M.S",
+))
+
+def stencil_count(board, tables):
+    counter = 0
+    rmx = len(board)
+    cmx = len(board[0]) if board else 0
+    for height, width, cells in tables:
+        (r0, c0, first), rest = cells[0], cells[1:]
+        for row in range(rmx - height + 1):
+            for col in range(cmx - width + 1):
+                if board[row+r0][col+c0] != first:
+                    continue
+                for dr, dc, ch in rest:
+                    if board[row+dr][col+dc] != ch:
+                        break
+                else:
+                    counter += 1
+    return counter
+
+def _stencil_count_numpy(arr, tables):
+    import numpy as np
+
+    counter = 0
+    rmx, cmx = arr.shape
+    for height, width, cells in tables:
+        if height > rmx or width > cmx:
+            continue
+        mask = np.ones((rmx - height + 1, cmx - width + 1), dtype=bool)
+        for dr, dc, ch in cells:
+            mask &= arr[dr:dr + mask.shape[0], dc:dc + mask.shape[1]] == ord(ch)
+        counter += int(np.count_nonzero(mask))
+    return counter
+
 
 def _get_data(src):
     with open(src, 'r') as f:
@@ -129,6 +484,15 @@ def word_count(src, word, fn, idx):
     board = _get_data(src)
     return _wc(board, word, fn, idx)
 
+def parse(src):
+    return _get_data(src)
+
+def part_one(board):
+    return _wc_numpy(board, "XMAS", _check_single, 0)
+
+def part_two(board):
+    return _wc_numpy(board, "MAS", _check_cross, 1)
+
 def main():
     print(f"word count: {word_count("data.txt", "XMAS", _check_single, 0)}")
     print(f"word count: {word_count("data.txt", "MAS", _check_cross, 1)}")
@@ -161,3 +525,89 @@ def test_check_single():
 def test_check_cross():
     testboard = _get_testboard()
     assert _wc(testboard, "MAS", _check_cross, 1) == 9
+
+def test_multi_word_count():
+    testboard = _get_testboard()
+    words = ["XMAS", "MAS", "SAM", "AMA", "XM", "A", "MMMSXXMASM", "QQ"]
+    counts = multi_word_count(testboard, words + ["XMAS"])
+    assert counts["XMAS"] == 18
+    for word in words:
+        assert counts[word] == _wc(testboard, word, _check_single, 0), word
+
+def test_multi_word_count_non_square():
+    board = ["ABCA", "BABC", "CBAB"]
+    for word in ["AB", "ABC", "BA", "CBA", "C"]:
+        assert multi_word_count(board, [word])[word] == _wc(board, word, _check_single, 0)
+
+def test_wc_numpy():
+    testboard = _get_testboard()
+    assert _wc_numpy(testboard, "XMAS", _check_single, 0) == 18
+    assert _wc_numpy(testboard, "MAS", _check_cross, 1) == 9
+    board = ["ABCA", "BABC", "CBAB"]
+    for word in ["AB", "ABC", "BA", "CBA", "C", "ABAB"]:
+        assert _wc_numpy(board, word, _check_single, 0) == _wc(board, word, _check_single, 0)
+    for word, idx in [("BAB", 1), ("ABC", 1), ("CBA", 1), ("A", 0)]:
+        assert _wc_numpy(board, word, _check_cross, idx) == _wc(board, word, _check_cross, idx)
+
+def test_board_index_count():
+    testboard = _get_testboard()
+    index = BoardIndex(testboard)
+    for word in ["XMAS", "MAS", "AMA", "XM", "A", "QQ"]:
+        assert index.count(word) == _wc(testboard, word, _check_single, 0), word
+
+def test_board_index_positions():
+    board = ["XMAS", "MXSA", "AXMS"]
+    index = BoardIndex(board)
+    found = index.positions("XM")
+    assert sorted(found) == [
+        (0, 0, 0, 1), (0, 0, 1, 0),
+        (1, 1, -1, 0), (1, 1, 0, -1), (1, 1, 1, 1),
+        (2, 1, -1, -1), (2, 1, 0, 1),
+    ]
+    for row, col, dr, dc in found:
+        assert board[row][col] + board[row + dr][col + dc] == "XM"
+    assert len(found) == index.count("XM") == _wc(board, "XM", _check_single, 0)
+
+def test_board_index_pickle(tmp_path):
+    index = BoardIndex(_get_testboard())
+    index.save(tmp_path / "board.idx")
+    loaded = BoardIndex.load(tmp_path / "board.idx")
+    assert loaded.count("XMAS") == 18
+    assert loaded.positions("XMAS") == index.positions("XMAS")
+
+def test_word_count_tiled(tmp_path):
+    src = tmp_path / "board.txt"
+    src.write_text("\n".join(_get_testboard()) + "\n")
+    for band_rows in (1, 2, 3, 10, 64):
+        assert word_count_tiled(src, "XMAS", _check_single, 0, band_rows, workers=2) == 18
+        assert word_count_tiled(src, "MAS", _check_cross, 1, band_rows, workers=2) == 9
+    crlf = tmp_path / "board_crlf.txt"
+    crlf.write_bytes("\r\n".join(_get_testboard()).encode())
+    assert word_count_tiled(crlf, "XMAS", _check_single, 0, 4, workers=2) == 18
+
+def test_compile_stencil():
+    assert len(x_mas_stencil) == 4
+    plus = compile_stencil((".A.", "AAA", ".A."))
+    assert len(plus) == 1
+    ell = compile_stencil(("X.", "M.", "AS"))
+    assert len(ell) == 8
+    assert len(compile_stencil(("X.", "M.", "AS"), reflections=False)) == 4
+    assert len(compile_stencil(("X.", "M.", "AS"), rotations=False)) == 2
+    assert compile_stencil(("..", ".Q")) == ((1, 1, ((0, 0, "Q"),)),)
+
+def test_stencil_count():
+    testboard = _get_testboard()
+    assert stencil_count(testboard, x_mas_stencil) == 9
+    assert _stencil_count_numpy(_to_array(testboard), x_mas_stencil) == 9
+    # rotations of a straight word only cover the four orthogonal directions
+    orthogonal = sum(
+        fn("XMAS", testboard, row, col, 10, 10, 4)
+        for fn in (_right, _down, _left, _up)
+        for row in range(10)
+        for col in range(10)
+        if testboard[row][col] == "X"
+    )
+    assert stencil_count(testboard, compile_stencil(("XMAS",))) == orthogonal == 8
+    plus = compile_stencil((".M.", "MAM", ".M."))
+    board = ["MMM.", "MAM.", "MMMA"]
+    assert stencil_count(board, plus) == _stencil_count_numpy(_to_array(board), plus) == 1
@@ -1,4 +1,7 @@
 import pytest
+from concurrent.futures import ProcessPoolExecutor
+from functools import cmp_to_key, lru_cache
+from itertools import batched
 
 class Node:
     def __init__(self, value: int, children: list):
@@ -44,6 +47,69 @@ class Node:
         if self.after is not None:
             yield from self.after.walk_in_order() 
 
+class RuleIndex:
+    """Ordering rules as a set of (before, after) pairs: O(1) precedence lookups
+
+    Sorting with compare() gives the same order as building a Node tree and
+    walking it, without the per-node child-list scans or the recursion.
+    """
+
+    def __init__(self, priorities: dict, cache_size=0):
+        self.pairs = {(a, b) for a, children in priorities.items() for b in children}
+        # the sorted order only depends on which pages are present, so sorts
+        # are memoised on the frozen page set; cache_size=0 turns this off
+        # and cache_size=None keeps every sort, as with lru_cache
+        self._sorted_pages = lru_cache(maxsize=cache_size)(self._sort_pages)
+
+    def precedes(self, a, b):
+        return (a, b) in self.pairs
+
+    def add_rule(self, a, b):
+        if (b, a) in self.pairs:
+            raise ValueError(f"rule {a}|{b} contradicts existing rule {b}|{a}")
+        self.pairs.add((a, b))
+        self._sorted_pages.cache_clear()
+
+    def remove_rule(self, a, b):
+        self.pairs.discard((a, b))
+        self._sorted_pages.cache_clear()
+
+    def cache_info(self):
+        return self._sorted_pages.cache_info()
+
+    def compare(self, a, b, line_number=None):
+        if (a, b) in self.pairs:
+            return -1
+        if (b, a) in self.pairs:
+            return 1
+        raise ValueError(
+            f"no rule orders values {a} and {b}: input line {line_number}"
+        )
+
+    def _sort_pages(self, pages, line_number=None):
+        return sorted(pages, key=cmp_to_key(lambda a, b: self.compare(a, b, line_number)))
+
+    def sort(self, line, line_number=None):
+        pages = frozenset(line)
+        if len(pages) != len(line) or self.cache_info().maxsize == 0:
+            return self._sort_pages(line, line_number)
+        try:
+            return list(self._sorted_pages(pages))
+        except ValueError:
+            # redo it uncached so the error carries the line number
+            return self._sort_pages(line, line_number)
+
+    def first_violation(self, line, line_number=None):
+        """Return the first rule (before, after) that line breaks, or None
+
+        Checking neighbours is enough: line is in sorted order exactly when
+        every adjacent pair is.
+        """
+        for a, b in zip(line, line[1:]):
+            if self.compare(a, b, line_number) > 0:
+                return (b, a)
+        return None
+
 def _get_data(src):
     priorities = {}
     updates = []
@@ -84,20 +150,164 @@ def _compute_median_sum(updates):
             ans += line[(len(line)//2)-1]
     return ans
 
-def sort_update_pages(src):
-    priorities, updates = _get_data(src)
+def _classify_updates(rules, updates):
+    # only updates that break a rule get sorted; violations holds
+    # (line number, first broken rule) for each of them
     unchanged_updates = []
     corrected_updates = []
+    violations = []
     for n, line in enumerate(updates):
-        processed = _sort_line(line, priorities, n)
-        if line == processed:
-            unchanged_updates.append(processed)
+        rule = rules.first_violation(line, n)
+        if rule is None:
+            unchanged_updates.append(line)
         else:
-            corrected_updates.append(processed)
+            corrected_updates.append(rules.sort(line, n))
+            violations.append((n, rule))
+    return (unchanged_updates, corrected_updates, violations)
+
+def sort_update_pages(src, violations=False):
+    # with violations=True, also return the (line number, first broken rule)
+    # of every update that had to be sorted
+    priorities, updates = _get_data(src)
+    unchanged_updates, corrected_updates, broken = _classify_updates(
+        RuleIndex(priorities), updates,
+    )
     sum_unchanged = _compute_median_sum(unchanged_updates)
     sum_corrected = _compute_median_sum(corrected_updates)
+    if violations:
+        return (sum_unchanged, sum_corrected, broken)
     return (sum_unchanged, sum_corrected)
 
+_worker_rules = None
+
+def _init_worker(priorities, cache_size):
+    global _worker_rules
+    _worker_rules = RuleIndex(priorities, cache_size)
+
+def _classify_batch(job):
+    # runs in a pool worker against the RuleIndex built by _init_worker;
+    # returns the batch's median sums and the cache hits/misses it caused
+    start, lines = job
+    before = _worker_rules.cache_info()
+    unchanged, corrected = 0, 0
+    for n, line in enumerate(lines, start):
+        if _worker_rules.first_violation(line, n) is None:
+            unchanged += _compute_median_sum([line])
+        else:
+            corrected += _compute_median_sum([_worker_rules.sort(line, n)])
+    after = _worker_rules.cache_info()
+    return (unchanged, corrected, after.hits - before.hits, after.misses - before.misses)
+
+def sort_update_pages_parallel(src, workers=None, batch_size=1024, cache_size=4096):
+    """Like sort_update_pages, but spread over a process pool
+
+    The rules are shipped once per worker through the pool initializer; each
+    worker keeps its own sort cache. Returns (sum unchanged, sum corrected,
+    {"hits": ..., "misses": ...}) with the cache counts summed over workers.
+    """
+    priorities, updates = _get_data(src)
+    jobs = [
+        (n * batch_size, batch)
+        for n, batch in enumerate(batched(updates, batch_size))
+    ]
+    sum_unchanged = sum_corrected = hits = misses = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(priorities, cache_size),
+    ) as pool:
+        for unchanged, corrected, h, m in pool.map(_classify_batch, jobs):
+            sum_unchanged += unchanged
+            sum_corrected += corrected
+            hits += h
+            misses += m
+    return (sum_unchanged, sum_corrected, {"hits": hits, "misses": misses})
+
+class UpdateEngine:
+    """Keeps both median sums current while the rule set changes
+
+    An inverted index maps each page to the updates containing it, so a rule
+    change only re-checks the updates holding both of its pages, and the sums
+    are adjusted by the difference in those updates' medians.
+    """
+
+    def __init__(self, priorities, updates):
+        self.rules = RuleIndex(priorities)
+        self.updates = updates
+        self.pages = {}
+        for n, line in enumerate(updates):
+            for page in line:
+                self.pages.setdefault(page, set()).add(n)
+        # per update: (is unchanged, median of its sorted form)
+        self.results = [None] * len(updates)
+        self.unresolved = set()
+        self.sum_unchanged = 0
+        self.sum_corrected = 0
+        for n in range(len(updates)):
+            self._evaluate(n)
+
+    def _evaluate(self, n):
+        line = self.updates[n]
+        try:
+            if self.rules.first_violation(line, n) is None:
+                result = (True, _compute_median_sum([line]))
+            else:
+                result = (False, _compute_median_sum([self.rules.sort(line, n)]))
+        except ValueError:
+            # a removed rule can leave two of its pages unordered; the update
+            # drops out of both sums until a rule orders them again
+            result = None
+        if self.results[n] is not None:
+            self._tally(self.results[n], -1)
+        self.results[n] = result
+        if result is None:
+            self.unresolved.add(n)
+        else:
+            self.unresolved.discard(n)
+            self._tally(result, 1)
+
+    def _tally(self, result, sign):
+        unchanged, median = result
+        if unchanged:
+            self.sum_unchanged += sign * median
+        else:
+            self.sum_corrected += sign * median
+
+    def _refresh(self, a, b):
+        affected = self.pages.get(a, set()) & self.pages.get(b, set())
+        for n in affected:
+            self._evaluate(n)
+        return len(affected)
+
+    def add_rule(self, a, b):
+        """Add rule a|b; returns the number of updates re-checked"""
+        self.rules.add_rule(a, b)
+        return self._refresh(a, b)
+
+    def remove_rule(self, a, b):
+        """Remove rule a|b; returns the number of updates re-checked"""
+        self.rules.remove_rule(a, b)
+        return self._refresh(a, b)
+
+    def sums(self):
+        return (self.sum_unchanged, self.sum_corrected)
+
+def parse(src):
+    return _get_data(src)
+
+def part_one(data):
+    # only needs the updates already in order, so nothing gets sorted here
+    priorities, updates = data
+    rules = RuleIndex(priorities)
+    return _compute_median_sum(
+        line for n, line in enumerate(updates) if rules.first_violation(line, n) is None
+    )
+
+def part_two(data):
+    priorities, updates = data
+    _, corrected_updates, _ = _classify_updates(RuleIndex(priorities), updates)
+    return _compute_median_sum(corrected_updates)
+
 def main():
     unch, corr = sort_update_pages("data.txt")
     print(f"median sum unchanged: {unch}\nmedian sum corrected: {corr}")
@@ -212,3 +422,121 @@ def test_compute_median_sum():
     ]
     median_sum = _compute_median_sum(test_data)
     assert median_sum == 143
+
+_sample_data = """\
+47|53
+97|13
+97|61
+97|47
+75|29
+61|13
+75|53
+29|13
+97|29
+53|29
+61|53
+97|53
+61|29
+47|13
+75|47
+97|75
+47|61
+75|61
+47|29
+75|13
+53|13
+
+75,47,61,53,29
+97,61,53,29,13
+75,29,13
+75,97,47,61,53
+61,13,29
+97,13,75,29,47
+"""
+
+@pytest.fixture
+def sample_src(tmp_path):
+    src = tmp_path / "sample.txt"
+    src.write_text(_sample_data)
+    return src
+
+def test_rule_index_sort_matches_tree(sample_src):
+    p, u = _get_data(sample_src)
+    rules = RuleIndex(p)
+    assert rules.precedes(47, 53)
+    assert not rules.precedes(53, 47)
+    for line in u:
+        assert rules.sort(line) == _sort_line(line, p)
+    # a longer chain in every order, well past what the tree handles comfortably
+    chain = list(range(300))
+    p = {a: [b for b in chain if b > a] for a in chain}
+    rules = RuleIndex(p)
+    assert rules.sort(chain[::-1]) == chain
+    with pytest.raises(ValueError, match="input line 7"):
+        rules.sort([1, 1000], 7)
+
+def test_sort_update_pages(sample_src):
+    assert sort_update_pages(sample_src) == (143, 123)
+    assert sort_update_pages(sample_src, violations=True) == (
+        143, 123, [(3, (97, 75)), (4, (29, 13)), (5, (75, 13))],
+    )
+
+def test_first_violation(sample_src):
+    p, u = _get_data(sample_src)
+    rules = RuleIndex(p)
+    assert [rules.first_violation(line) for line in u] == [
+        None, None, None, (97, 75), (29, 13), (75, 13),
+    ]
+    unchanged, corrected, violations = _classify_updates(rules, u)
+    assert unchanged == u[:3]
+    assert corrected == [rules.sort(line) for line in u[3:]]
+    assert violations == [(3, (97, 75)), (4, (29, 13)), (5, (75, 13))]
+
+def test_update_engine_tracks_rule_changes(sample_src):
+    p, u = _get_data(sample_src)
+    engine = UpdateEngine(p, u)
+    assert engine.sums() == sort_update_pages(sample_src) == (143, 123)
+    # flip 97|75 to 75|97: update 3 becomes valid as written, update 1 does
+    # not hold 75 and must not be touched
+    assert engine.remove_rule(97, 75) == 2
+    assert engine.unresolved == {3, 5}
+    assert engine.sums() == (143, 123 - 47 - 47)
+    assert engine.add_rule(75, 97) == 2
+    assert engine.unresolved == set()
+    expected_p = {a: [b for b in bs if (a, b) != (97, 75)] for a, bs in p.items()}
+    expected_p[75].append(97)
+    expected = _classify_updates(RuleIndex(expected_p), u)
+    assert engine.sums() == (
+        _compute_median_sum(expected[0]), _compute_median_sum(expected[1]),
+    )
+    assert engine.results[3] == (True, 47)
+    with pytest.raises(ValueError, match="contradicts"):
+        engine.add_rule(97, 75)
+
+def test_rule_index_sort_cache(sample_src):
+    p, u = _get_data(sample_src)
+    rules = RuleIndex(p, cache_size=16)
+    for line in u + [line[::-1] for line in u]:
+        assert rules.sort(line) == _sort_line(line, p)
+    info = rules.cache_info()
+    assert (info.hits, info.misses) == (6, 6)
+    rules.add_rule(13, 99)
+    assert rules.cache_info().currsize == 0
+    assert RuleIndex(p).sort(u[3]) == [97,75,47,61,53]
+    assert RuleIndex(p).cache_info().maxsize == 0
+    unbounded = RuleIndex(p, cache_size=None)
+    for line in u + u:
+        unbounded.sort(line)
+    info = unbounded.cache_info()
+    assert (info.hits, info.misses, info.maxsize) == (6, 6, None)
+    with pytest.raises(ValueError, match="input line 4"):
+        rules.sort([13, 1000], 4)
+
+def test_sort_update_pages_parallel(tmp_path):
+    src = tmp_path / "repeated.txt"
+    rules, updates = _sample_data.split("\n\n")
+    src.write_text(rules + "\n\n" + updates * 3 + "47,75,97\n")
+    unchanged, corrected, stats = sort_update_pages_parallel(src, workers=2, batch_size=4)
+    assert (unchanged, corrected) == sort_update_pages(src) == (3 * 143, 3 * 123 + 75)
+    assert stats["hits"] + stats["misses"] == 3 * 3 + 1
+    assert stats["misses"] <= 2 * 4
@@ -1,6 +1,11 @@
 import pytest
-from time import sleep
+from array import array
+from bisect import bisect_left, bisect_right
+from time import perf_counter, sleep
+import random
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
 # import traceback
 # import logging
 
@@ -33,6 +38,8 @@ class Guard:
         self.board = board
         self.position = self._find_self()
         self.heading = self._headings[0]
+        # visited cells live here, not in the board, so the board is only read
+        self.visited = bytearray(len(board) * len(board[0]))
 
     def _find_self(self) -> list:
         for r, row in enumerate(self.board):
@@ -125,10 +132,17 @@ class Guard:
         return turn_count
 
     def _is_cell_new(self, row, col):
-        return self.board[row][col] != self._visited
+        return not self.visited[row*len(self.board[0]) + col]
 
     def _mark(self, row, col):
-        self.board[row][col] = self._visited
+        self.visited[row*len(self.board[0]) + col] = 1
+
+    def _cell_glyph(self, row, col):
+        if not self._in_bounds(row, col):
+            return ' '
+        if not self._is_cell_new(row, col):
+            return self._visited
+        return self.board[row][col]
 
     def _in_bounds(self, row, col):
         return row >= 0 and row < len(self.board) and col >= 0 and col < len(self.board[0])
@@ -152,7 +166,7 @@ class Guard:
         gmark = self._gmarkers[self._headings.index(self.heading)]
         window = []
         for r in range(row-size, row+size+1):
-            window.append([self.board[r][c] if self._in_bounds(r, c) else ' ' for c in range(col-size, col+size+1)])
+            window.append([self._cell_glyph(r, c) for c in range(col-size, col+size+1)])
         window[size][size] = f"\033[30;45m{gmark}\033[0m"
         return ('\n'.join([' '.join(line) for line in window]), len(window))
 
@@ -164,6 +178,616 @@ class Guard:
         print(f"unique steps: {us}")
         sleep(delay)
 
+class FastGuard:
+    """Compact stand-in for Guard: the board lives in one flat bytearray,
+    the heading is an index into the delta tables, and march() is a single
+    loop with no per-step method calls. Same counts as Guard.march().
+
+    march() jumps from turn to turn using the sorted obstacle positions of
+    each row and column; _march_stepwise() is the cell-by-cell reference.
+
+    The grid and obstacle indexes are read-only and shared between forks;
+    only the position, heading and visited bitmap belong to one guard.
+    """
+
+    __slots__ = (
+        "rows", "cols", "grid", "row_blocks", "col_blocks",
+        "row", "col", "heading", "visited",
+    )
+
+    _guard = ord(Guard._guard)
+    _blocked = ord(Guard._blocked)
+    # North, East, South, West, as in Guard._headings
+    _drow = (-1, 0, 1, 0)
+    _dcol = (0, 1, 0, -1)
+
+    def __init__(self, board):
+        self.rows = len(board)
+        self.cols = len(board[0]) if board else 0
+        self.grid = "".join("".join(row) for row in board).encode("ascii")
+        start = self.grid.find(self._guard)
+        if start == -1:
+            raise ValueError("Guard not found!")
+        self.row, self.col = divmod(start, self.cols)
+        self.heading = 0
+        # obstacle columns per row and obstacle rows per column, both sorted
+        self.row_blocks = [[] for _ in range(self.rows)]
+        self.col_blocks = [[] for _ in range(self.cols)]
+        at = self.grid.find(self._blocked)
+        while at != -1:
+            row, col = divmod(at, self.cols)
+            self.row_blocks[row].append(col)
+            self.col_blocks[col].append(row)
+            at = self.grid.find(self._blocked, at + 1)
+        # one byte per cell, 1 once the guard has stood there
+        self.visited = bytearray(self.rows * self.cols)
+
+    def fork(self):
+        """Return an independent guard sharing this one's grid and indexes
+
+        Only the position, heading and visited bitmap are copied, so many
+        what-if walks can branch off one parsed board cheaply.
+        """
+        clone = FastGuard.__new__(FastGuard)
+        clone.rows, clone.cols = self.rows, self.cols
+        clone.grid = self.grid
+        clone.row_blocks, clone.col_blocks = self.row_blocks, self.col_blocks
+        clone.row, clone.col, clone.heading = self.row, self.col, self.heading
+        clone.visited = bytearray(self.visited)
+        return clone
+
+    def get_heading(self):
+        return Guard._headings[self.heading]
+
+    def get_position(self):
+        return [self.row, self.col]
+
+    def _segment_end(self, row, col, heading, extra=None):
+        # last open cell before the next obstacle (or the edge) along heading;
+        # extra is an optional (row, col) treated as one more obstacle
+        match heading:
+            case 0:
+                blocks = self.col_blocks[col]
+                i = bisect_left(blocks, row)
+                end_row, end_col = (blocks[i-1] + 1 if i else 0, col)
+                if extra and extra[1] == col and end_row <= extra[0] < row:
+                    end_row = extra[0] + 1
+            case 1:
+                blocks = self.row_blocks[row]
+                i = bisect_right(blocks, col)
+                end_row, end_col = (row, blocks[i] - 1 if i < len(blocks) else self.cols - 1)
+                if extra and extra[0] == row and col < extra[1] <= end_col:
+                    end_col = extra[1] - 1
+            case 2:
+                blocks = self.col_blocks[col]
+                i = bisect_right(blocks, row)
+                end_row, end_col = (blocks[i] - 1 if i < len(blocks) else self.rows - 1, col)
+                if extra and extra[1] == col and row < extra[0] <= end_row:
+                    end_row = extra[0] - 1
+            case 3:
+                blocks = self.row_blocks[row]
+                i = bisect_left(blocks, col)
+                end_row, end_col = (row, blocks[i-1] + 1 if i else 0)
+                if extra and extra[0] == row and end_col <= extra[1] < col:
+                    end_col = extra[1] + 1
+        return (end_row, end_col)
+
+    def loops(self, extra=None):
+        """Return True if the guard never leaves the map from where it stands
+
+        extra optionally adds one obstacle at (row, col) without touching the
+        grid. Each (cell, heading) a straight run starts from is recorded as
+        one bit in a per-cell bitmap; meeting one again means the walk cycles.
+        A guard boxed in on all four sides never leaves either.
+        """
+        grid = self.grid
+        rows, cols = self.rows, self.cols
+        drow, dcol = self._drow, self._dcol
+        blocked = self._blocked
+        extra_at = extra[0]*cols + extra[1] if extra else -1
+        seen = bytearray(rows * cols)
+        row, col, heading = self.row, self.col, self.heading
+        while True:
+            for _ in range(4):
+                next_row = row + drow[heading]
+                next_col = col + dcol[heading]
+                if not (0 <= next_row < rows and 0 <= next_col < cols):
+                    return False
+                at = next_row*cols + next_col
+                if grid[at] != blocked and at != extra_at:
+                    break
+                heading = (heading + 1) % 4
+            else:
+                return True
+            bit = 1 << heading
+            if seen[row*cols + col] & bit:
+                return True
+            seen[row*cols + col] |= bit
+            row, col = self._segment_end(row, col, heading, extra)
+
+    def march(self, limit=10000, trace=None):
+        """Walk until the guard leaves the map; see Guard.march() for limit
+
+        Returns the number of unique cells visited, or None if the limit is
+        hit first or the walk loops. If a Trace is given, every straight run
+        is appended to it as it happens.
+        """
+        grid, visited = self.grid, self.visited
+        rows, cols = self.rows, self.cols
+        drow, dcol = self._drow, self._dcol
+        blocked = self._blocked
+        row, col, heading = self.row, self.col, self.heading
+        unique_steps = 0
+        # whether the cell we are standing on was new when we reached it:
+        # the step-by-step walk only gets to count its final cell if it was
+        # below the limit before that cell
+        last_new = not visited[row*cols + col]
+        if last_new:
+            visited[row*cols + col] = 1
+            unique_steps = 1
+        # (cell, heading) bits for every straight run started: a repeat is a loop
+        seen = bytearray(rows * cols)
+        try:
+            while True:
+                for _ in range(4):
+                    next_row = row + drow[heading]
+                    next_col = col + dcol[heading]
+                    if not (0 <= next_row < rows and 0 <= next_col < cols):
+                        return unique_steps if unique_steps - last_new < limit else None
+                    if grid[next_row*cols + next_col] != blocked:
+                        break
+                    heading = (heading + 1) % 4
+                else:
+                    raise MapError(f"all directions blocked at [{[row, col]}]")
+                if unique_steps >= limit or seen[row*cols + col] & (1 << heading):
+                    return None
+                seen[row*cols + col] |= 1 << heading
+                end_row, end_col = self._segment_end(row, col, heading)
+                first = next_row*cols + next_col
+                last = end_row*cols + end_col
+                stride = abs(drow[heading]*cols + dcol[heading])
+                lo, hi = min(first, last), max(first, last) + 1
+                segment = visited[lo:hi:stride]
+                last_new = not visited[last]
+                unique_steps += len(segment) - segment.count(1)
+                visited[lo:hi:stride] = b"\x01" * len(segment)
+                if trace is not None:
+                    trace.record(heading, len(segment))
+                row, col = end_row, end_col
+        finally:
+            self.row, self.col, self.heading = row, col, heading
+
+    def _march_stepwise(self, limit=10000):
+        grid, visited = self.grid, self.visited
+        rows, cols = self.rows, self.cols
+        drow, dcol = self._drow, self._dcol
+        blocked = self._blocked
+        row, col, heading = self.row, self.col, self.heading
+        unique_steps = 0
+        try:
+            while unique_steps < limit:
+                if not visited[row*cols + col]:
+                    visited[row*cols + col] = 1
+                    unique_steps += 1
+                for _ in range(4):
+                    next_row = row + drow[heading]
+                    next_col = col + dcol[heading]
+                    if not (0 <= next_row < rows and 0 <= next_col < cols):
+                        return unique_steps
+                    if grid[next_row*cols + next_col] != blocked:
+                        break
+                    heading = (heading + 1) % 4
+                else:
+                    raise MapError(f"all directions blocked at [{[row, col]}]")
+                row, col = next_row, next_col
+            return None
+        finally:
+            self.row, self.col, self.heading = row, col, heading
+
+def _random_board(size, density, seed=0):
+    # random obstacles, guard in the middle; retries until the walk exits
+    rng = random.Random(seed)
+    while True:
+        board = [
+            ['#' if rng.random() < density else '.' for _ in range(size)]
+            for _ in range(size)
+        ]
+        board[size//2][size//2] = '^'
+        if not FastGuard(board).loops():
+            return board
+
+def _benchmark_march(size=1000, density=0.005, repeat=5):
+    limit = size * size
+    for name, cls in (("Guard", Guard), ("FastGuard", FastGuard)):
+        elapsed = 0.0
+        for seed in range(repeat):
+            guard = cls(_random_board(size, density, seed))
+            t0 = perf_counter()
+            steps = guard.march(limit=limit)
+            elapsed += perf_counter() - t0
+        print(f"{name:<10}: {elapsed:8.4f}s (last walk: {steps} unique steps)")
+
+def _spiral_board(size, gap=3):
+    # obstacles that send the guard on an outward spiral from the middle, so
+    # a walk covers a third of the board, like the puzzle inputs do
+    board = [['.'] * size for _ in range(size)]
+    row = col = size // 2
+    board[row][col] = '^'
+    heading, length = 0, gap
+    for turn in range(4 * size):
+        row += FastGuard._drow[heading] * length
+        col += FastGuard._dcol[heading] * length
+        block_row = row + FastGuard._drow[heading]
+        block_col = col + FastGuard._dcol[heading]
+        if not (0 <= block_row < size and 0 <= block_col < size):
+            break
+        board[block_row][block_col] = '#'
+        heading = (heading + 1) % 4
+        if turn % 2:
+            length += gap
+    return board
+
+def _benchmark_batch(count=256, size=130, seed=0):
+    # variant maps: the spiral board with one extra random obstacle each
+    rng = random.Random(seed)
+    base = _spiral_board(size)
+    boards = []
+    for _ in range(count):
+        board = [row.copy() for row in base]
+        row, col = rng.randrange(size), rng.randrange(size)
+        if board[row][col] == '.':
+            board[row][col] = '#'
+        boards.append(board)
+    # keep the lazy numpy import out of the timing
+    batch_march(boards[:1])
+    best = {}
+    for _ in range(3):
+        t0 = perf_counter()
+        expected = []
+        for board in boards:
+            try:
+                expected.append(FastGuard(board).march(limit=size * size + 1))
+            except MapError:
+                expected.append(None)
+        t1 = perf_counter()
+        counts, reasons = batch_march(boards)
+        t2 = perf_counter()
+        best["FastGuard"] = min(best.get("FastGuard", t1 - t0), t1 - t0)
+        best["batch_march"] = min(best.get("batch_march", t2 - t1), t2 - t1)
+    for name, seconds in best.items():
+        print(f"{name:<12}: {seconds:8.4f}s ({count} boards, best of 3)")
+    assert [int(c) if r == 0 else None for c, r in zip(counts, reasons)] == expected
+
+class Trace:
+    """A walk stored as run-length (heading, length) segments
+
+    Recording costs one append per straight run, so a march at full speed can
+    fill it; TraceRenderer turns it back into frames afterwards.
+    """
+
+    def __init__(self, guard):
+        self.start = (guard.row, guard.col)
+        self.heading = guard.heading
+        self.headings = array('b')
+        self.lengths = array('q')
+
+    def record(self, heading, length):
+        self.headings.append(heading)
+        self.lengths.append(length)
+
+    def __len__(self):
+        # number of steps taken, not counting the start cell
+        return sum(self.lengths)
+
+class TraceRenderer:
+    """Replays a Trace over the board it was recorded on
+
+    The renderer keeps its own visited bitmap and a cursor; moving the cursor
+    forwards only marks the segments in between, moving it back rebuilds from
+    the start, so playing frames in order costs O(steps) overall.
+    """
+
+    def __init__(self, guard, trace, size=15):
+        self.grid = guard.grid
+        self.rows, self.cols = guard.rows, guard.cols
+        self.trace = trace
+        self.size = size
+        # cumulative step count at the end of each segment, and the cell each
+        # segment starts from
+        self.ends = array('q')
+        self.origins = []
+        row, col = trace.start
+        total = 0
+        for heading, length in zip(trace.headings, trace.lengths):
+            self.origins.append((row, col))
+            total += length
+            self.ends.append(total)
+            row += FastGuard._drow[heading] * length
+            col += FastGuard._dcol[heading] * length
+        # len(trace) re-sums every segment, so keep the total for seek()
+        self.total = total
+        self._rewind()
+
+    def _rewind(self):
+        self.visited = bytearray(self.rows * self.cols)
+        row, col = self.trace.start
+        self.visited[row*self.cols + col] = 1
+        self.step = 0
+
+    def state(self, step):
+        """Return (row, col, heading) after step steps"""
+        if step <= 0 or not self.ends:
+            return (*self.trace.start, self.trace.heading)
+        i = min(bisect_left(self.ends, step), len(self.ends) - 1)
+        step = min(step, self.ends[i])
+        heading = self.trace.headings[i]
+        taken = step - (self.ends[i-1] if i else 0)
+        row, col = self.origins[i]
+        return (row + FastGuard._drow[heading]*taken, col + FastGuard._dcol[heading]*taken, heading)
+
+    def seek(self, step):
+        step = max(0, min(step, self.total))
+        if step < self.step:
+            self._rewind()
+        cols = self.cols
+        i = bisect_right(self.ends, self.step)
+        while self.step < step:
+            heading = self.trace.headings[i]
+            seg_start = self.ends[i-1] if i else 0
+            upto = min(step, self.ends[i])
+            row, col = self.origins[i]
+            delta = FastGuard._drow[heading]*cols + FastGuard._dcol[heading]
+            base = row*cols + col
+            first = base + (self.step - seg_start + 1)*delta
+            last = base + (upto - seg_start)*delta
+            lo, hi = min(first, last), max(first, last) + 1
+            self.visited[lo:hi:abs(delta)] = b"\x01" * ((hi - lo - 1)//abs(delta) + 1)
+            self.step = upto
+            i += 1
+        return self.state(step)
+
+    def render(self, step=None):
+        if step is not None:
+            self.seek(step)
+        row, col, heading = self.state(self.step)
+        size, cols = self.size, self.cols
+        window = []
+        for r in range(row-size, row+size+1):
+            line = []
+            for c in range(col-size, col+size+1):
+                if not (0 <= r < self.rows and 0 <= c < cols):
+                    line.append(' ')
+                elif self.visited[r*cols + c]:
+                    line.append(Guard._visited)
+                else:
+                    line.append(chr(self.grid[r*cols + c]))
+            window.append(line)
+        window[size][size] = f"\033[30;45m{Guard._gmarkers[heading]}\033[0m"
+        return '\n'.join([' '.join(line) for line in window])
+
+    def frame_steps(self, start=0, every=1, turns_only=False):
+        """Yield the step numbers to draw: every Nth step, or only the turns;
+        the final step is always included"""
+        total = self.total
+        if turns_only:
+            steps = [start] + [end for end in self.ends if end > start]
+        else:
+            steps = range(start, total + 1, max(1, every))
+        last = None
+        for last in steps:
+            yield last
+        if last != total:
+            yield total
+
+    def export(self, path, **frame_options):
+        with open(path, 'w') as f:
+            for step in self.frame_steps(**frame_options):
+                f.write(f"step {step}\n{self.render(step)}\n\n")
+
+    def play(self, delay=0.025, **frame_options):
+        side = 2*self.size + 1
+        for n, step in enumerate(self.frame_steps(**frame_options)):
+            if n:
+                print("\033[A"*(side+2))
+            print(self.render(step))
+            print(f"step: {step}")
+            sleep(delay)
+
+_search_guard = None
+
+def _init_search(board):
+    global _search_guard
+    _search_guard = FastGuard(board)
+
+def _looping_candidates(candidates):
+    return [pos for pos in candidates if _search_guard.loops(pos)]
+
+def find_loop_obstacles(board, workers=None, chunk_size=256):
+    """Return (count, positions) of single extra obstacles that trap the guard
+
+    Only cells on the guard's original path can change its walk, so those
+    (minus the start cell) are the only candidates tried; if the walk already
+    loops without help, every open cell qualifies. Candidates are spread over
+    a process pool; every worker builds its own FastGuard once.
+    """
+    guard = FastGuard(board)
+    start = guard.row*guard.cols + guard.col
+    if guard.loops():
+        cells = guard.grid
+        wanted = ord(Guard._open)
+    else:
+        walker = guard.fork()
+        walker.march(limit=guard.rows*guard.cols + 1)
+        cells = walker.visited
+        wanted = 1
+    candidates = [
+        divmod(at, guard.cols)
+        for at, cell in enumerate(cells)
+        if cell == wanted and at != start
+    ]
+    if workers == 1:
+        _init_search(board)
+        positions = _looping_candidates(candidates)
+        return (len(positions), positions)
+    jobs = [candidates[i:i + chunk_size] for i in range(0, len(candidates), chunk_size)]
+    positions = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_search, initargs=(board,),
+    ) as pool:
+        for found in pool.map(_looping_candidates, jobs):
+            positions.extend(found)
+    return (len(positions), positions)
+
+# reason codes returned by batch_march, indexing this tuple
+termination_reasons = ("exited", "looped", "trapped")
+
+def _spread(counts):
+    # (owner, k) pairs enumerating k = 0..counts[owner]-1 for every owner
+    import numpy as np
+
+    owner = np.repeat(np.arange(counts.size), counts)
+    k = np.arange(owner.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, k
+
+def _mark_runs(visited, guards, start, end, horizontal, cols):
+    # set the visited bits from the cell after start up to end, one straight
+    # run per guard; every byte index below comes up once, so plain |= works
+    import numpy as np
+
+    flat = visited.reshape(-1)
+    row_bytes = visited.shape[1]
+    stride = np.where(horizontal, 1, cols)
+    lo = np.where(start < end, start + stride, end)
+    hi = np.where(start < end, end, start - stride)
+    # horizontal runs are contiguous bits: set them a masked byte at a time
+    lo_h, hi_h = lo[horizontal], hi[horizontal]
+    first = lo_h >> 3
+    owner, k = _spread((hi_h >> 3) - first + 1)
+    byte = first[owner] + k
+    low_bit = np.clip(lo_h[owner] - 8*byte, 0, 7)
+    high_bit = np.clip(hi_h[owner] - 8*byte, 0, 7)
+    flat[guards[horizontal][owner]*row_bytes + byte] |= (
+        (0xFF << low_bit) & (0xFF >> (7 - high_bit))
+    ).astype(np.uint8)
+    # vertical runs have one cell per byte, unless rows are under 8 cells
+    vertical = ~horizontal
+    lo_v = lo[vertical]
+    owner, k = _spread((hi[vertical] - lo_v) // cols + 1)
+    cell = lo_v[owner] + k*cols
+    at = guards[vertical][owner]*row_bytes + (cell >> 3)
+    bits = (1 << (cell & 7)).astype(np.uint8)
+    if cols >= 8:
+        flat[at] |= bits
+    else:
+        np.bitwise_or.at(flat, at, bits)
+
+def batch_march(boards, starts=None):
+    """Walk one guard per board in lockstep; all boards must be the same size
+
+    starts optionally gives a (row, col) per board instead of its '^'. Every
+    tick each live guard turns until the way ahead is open and then runs
+    straight to the next obstacle, found by one searchsorted over the sorted
+    obstacle positions of every board's rows and columns (the vectorized
+    row_blocks/col_blocks of FastGuard). A guard retires when it leaves the
+    map, starts a run from the same (cell, heading) twice, or is boxed in.
+    Visited cells and run starts are packed bitsets per guard: one bit per
+    cell and one bit per (cell, heading) respectively.
+
+    Returns (counts, reasons): unique cells visited per guard and an index
+    into termination_reasons. An exited guard's count matches
+    FastGuard(board).march(); looped is march() returning None, trapped is
+    march() raising MapError.
+    """
+    # numpy is only needed here, so the rest of day 6 runs without it
+    import numpy as np
+
+    n = len(boards)
+    rows, cols = len(boards[0]), len(boards[0][0])
+    size = rows * cols
+    # one byte per cell, encoded the same way as FastGuard.grid
+    cells = np.frombuffer(
+        "".join("".join(map("".join, board)) for board in boards).encode("ascii"),
+        dtype=np.uint8,
+    ).reshape(n, rows, cols)
+    blocked = cells == ord(Guard._blocked)
+    if starts is None:
+        found = (cells == ord(Guard._guard)).reshape(n, size)
+        if not found.any(axis=1).all():
+            raise ValueError("Guard not found!")
+        pos = found.argmax(axis=1)
+    else:
+        pos = np.array([r*cols + c for r, c in starts], dtype=np.int64)
+    # obstacle keys for all boards in one sorted array: board/row/col for the
+    # rows, then board/col/row (offset past the row keys) for the columns
+    keys = np.concatenate((
+        np.flatnonzero(blocked),
+        np.flatnonzero(blocked.transpose(0, 2, 1)) + n*size,
+    ))
+    blocked = blocked.reshape(n, size)
+    drow = np.array(FastGuard._drow)
+    dcol = np.array(FastGuard._dcol)
+    every = np.arange(n)
+    heading = np.zeros(n, dtype=np.int64)
+    visited = np.zeros((n, (size + 7) // 8), dtype=np.uint8)
+    visited[every, pos >> 3] |= (1 << (pos & 7)).astype(np.uint8)
+    seen = np.zeros((n, (4*size + 63) // 64), dtype=np.uint64)
+    reasons = np.full(n, -1, dtype=np.int64)
+    # a run only stops in front of an obstacle, so after the first tick every
+    # guard turns right once before looking ahead
+    turned = np.zeros(n, dtype=np.int64)
+    live = every
+    while live.size:
+        p = pos[live]
+        h = (heading[live] + turned[live]) % 4
+        row, col = np.divmod(p, cols)
+        for _ in range(4):
+            next_row = row + drow[h]
+            next_col = col + dcol[h]
+            off = (next_row < 0) | (next_row >= rows) | (next_col < 0) | (next_col >= cols)
+            wall = ~off & blocked[live, np.where(off, 0, next_row*cols + next_col)]
+            if not wall.any():
+                break
+            h = np.where(wall, (h + 1) % 4, h)
+        else:
+            reasons[live[wall]] = 2
+        heading[live] = h
+        reasons[live[off]] = 0
+        going = ~off & ~wall
+        g, p, h, row, col = live[going], p[going], h[going], row[going], col[going]
+        # starting a run from the same (cell, heading) twice means a loop
+        bit = 4*p + h
+        word = bit >> 6
+        mask = np.left_shift(np.uint64(1), (bit & 63).astype(np.uint64))
+        looped = (seen[g, word] & mask) != 0
+        seen[g, word] |= mask
+        reasons[g[looped]] = 1
+        fresh = ~looped
+        g, p, h, row, col = g[fresh], p[fresh], h[fresh], row[fresh], col[fresh]
+        # last open cell before the next obstacle, as in FastGuard._segment_end
+        horizontal = (h & 1) == 1
+        forward = (h == 1) | (h == 2)
+        length = np.where(horizontal, cols, rows)
+        along = np.where(horizontal, col, row)
+        base = np.where(horizontal, (g*rows + row)*cols, n*size + (g*cols + col)*rows)
+        i = np.searchsorted(keys, base + along + forward)
+        i = np.where(forward, i, i - 1)
+        hit = keys[np.clip(i, 0, len(keys) - 1)] - base if len(keys) else along
+        ahead = np.where(forward, (i < len(keys)) & (hit < length), (i >= 0) & (hit >= 0))
+        end = np.where(
+            ahead,
+            np.where(forward, hit - 1, hit + 1),
+            np.where(forward, length - 1, 0),
+        )
+        # a run that reaches the edge walks off the map next
+        reasons[g[~ahead]] = 0
+        end = np.where(horizontal, row*cols + end, end*cols + col)
+        _mark_runs(visited, g, p, end, horizontal, cols)
+        pos[g] = end
+        turned[g] = 1
+        live = live[reasons[live] < 0]
+    popcount = np.array([bin(b).count("1") for b in range(256)], dtype=np.int64)
+    return popcount[visited].sum(axis=1), reasons
+
 def _get_data(src):
     with open(src, 'r') as f:
         board = [[c for c in line.strip()] for line in f.readlines()]
@@ -171,11 +795,35 @@ def _get_data(src):
 
 def map_route(src):
     board = _get_data(src)
-    guard = Guard(board)
     display = True if len(sys.argv) > 1 else False
-    return guard.march(display=display)
+    guard = FastGuard(board)
+    if not display:
+        return guard.march()
+    # walk at full speed first, then replay; an optional second argument
+    # draws only every Nth step
+    trace = Trace(guard)
+    steps = guard.march(trace=trace)
+    every = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    TraceRenderer(FastGuard(board), trace).play(every=every)
+    return steps
+
+def parse(src):
+    return _get_data(src)
+
+def part_one(board):
+    return FastGuard(board).march(limit=len(board) * len(board[0]) + 1)
+
+def part_two(board):
+    # the runner already spreads days over a pool; search in-process here
+    return find_loop_obstacles(board, workers=1)[0]
 
 def main():
+    if sys.argv[1:2] == ["bench"]:
+        if sys.argv[2:3] == ["batch"]:
+            _benchmark_batch()
+        else:
+            _benchmark_march()
+        return
     print(f"total steps: {map_route("data.txt")}")
 
 if __name__ == "__main__":
@@ -290,3 +938,168 @@ def test_full_walk(testboard):
 def test_create_display_window(testboard):
     g = Guard(testboard)
     assert g._create_display_window(6, 4, size=3) == (". # . . . . .\n. . . . . . #\n. . . . . . .\n# . . \033[30;45m^\033[0m . . .\n. . . . . . .\n. . . . . . .\n. . . . . # .", 7)
+
+_sample_data = """\
+....#.....
+.........#
+..........
+..#.......
+.......#..
+..........
+.#..^.....
+........#.
+#.........
+......#...
+"""
+
+@pytest.fixture
+def sampleboard():
+    return [[c for c in line] for line in _sample_data.splitlines()]
+
+def test_fast_guard_full_walk(sampleboard):
+    g = FastGuard(sampleboard)
+    assert g.get_position() == [6, 4]
+    assert g.get_heading() == "North"
+    assert g.march() == 41
+    assert sampleboard[6][4] == '^'
+    with pytest.raises(ValueError, match="Guard not found!"):
+        FastGuard([['.','.','.',], ['.','.','.',], ['.','.','.',],])
+    with pytest.raises(MapError):
+        FastGuard([['.','#','.',], ['#','^','#',], ['.','#','.',],]).march()
+
+def test_fast_guard_matches_guard():
+    for seed in range(20):
+        board = _random_board(30, 0.1, seed)
+        expected = Guard([row.copy() for row in board]).march(limit=900)
+        assert FastGuard(board).march(limit=900) == expected
+
+def test_fast_guard_jumps_match_stepwise(sampleboard):
+    for seed in range(20):
+        board = _random_board(40, 0.08, seed)
+        total = FastGuard(board)._march_stepwise(limit=1600)
+        assert FastGuard(board).march(limit=1600) == total
+        for limit in (1, total - 1, total, total + 1):
+            assert FastGuard(board).march(limit) == FastGuard(board)._march_stepwise(limit)
+    g = FastGuard(sampleboard)
+    assert g.march() == 41
+    assert g.get_position() == [9, 7]
+    assert g.get_heading() == "South"
+
+def test_fast_guard_loops(sampleboard):
+    g = FastGuard(sampleboard)
+    assert not g.loops()
+    assert g.loops((6, 3))
+    assert not g.loops((0, 0))
+    assert g.march() == 41
+    sampleboard[6][3] = '#'
+    assert FastGuard(sampleboard).march() is None
+
+def test_find_loop_obstacles(sampleboard):
+    count, positions = find_loop_obstacles(sampleboard, workers=2, chunk_size=8)
+    assert count == 6
+    assert sorted(positions) == [(6, 3), (7, 6), (7, 7), (8, 1), (8, 3), (9, 7)]
+
+def test_guard_leaves_board_untouched(sampleboard):
+    snapshot = [row.copy() for row in sampleboard]
+    assert Guard(sampleboard).march() == 41
+    assert FastGuard(sampleboard).march() == 41
+    assert sampleboard == snapshot
+
+def test_fast_guard_fork(sampleboard):
+    g = FastGuard(sampleboard)
+    f = g.fork()
+    assert f.grid is g.grid and f.row_blocks is g.row_blocks
+    assert f.visited is not g.visited
+    assert f.march() == 41
+    assert g.visited.count(1) == 0
+    assert g.get_position() == [6, 4]
+    assert g.fork().march() == 41
+    # forking mid-walk keeps what has been visited so far
+    g.march(limit=5)
+    h = g.fork()
+    assert h.visited == g.visited
+    assert (h.row, h.col, h.heading) == (g.row, g.col, g.heading)
+
+def test_trace_records_segments(sampleboard):
+    g = FastGuard(sampleboard)
+    trace = Trace(g)
+    assert g.march(trace=trace) == 41
+    assert trace.start == (6, 4)
+    assert list(trace.headings)[:4] == [0, 1, 2, 3]
+    assert list(trace.lengths)[:4] == [5, 4, 5, 6]
+    assert len(trace) == sum(trace.lengths)
+
+def test_trace_renderer_replay(sampleboard):
+    g = FastGuard(sampleboard)
+    trace = Trace(g)
+    g.march(trace=trace)
+    renderer = TraceRenderer(FastGuard(sampleboard), trace, size=3)
+    # seeking anywhere agrees with walking Guard the same number of steps
+    for step in (len(trace), 0, 7, 5, 1, len(trace) - 1):
+        guard = Guard([row.copy() for row in sampleboard])
+        for _ in range(step):
+            turns = guard._peek()
+            guard._turn_right(turns)
+            guard._step()
+        row, col, heading = renderer.seek(step)
+        assert [row, col] == guard.get_position()
+    assert renderer.total == len(trace)
+    assert renderer.seek(len(trace)) == (9, 7, 2)
+    assert renderer.visited == g.visited
+    assert renderer.render(0) == Guard(sampleboard)._create_display_window(6, 4, size=3)[0]
+    assert list(renderer.frame_steps(turns_only=True))[:3] == [0, 5, 9]
+    assert list(renderer.frame_steps(every=10)) == [0, 10, 20, 30, 40, 44]
+
+def test_trace_renderer_export(sampleboard, tmp_path):
+    g = FastGuard(sampleboard)
+    trace = Trace(g)
+    g.march(trace=trace)
+    out = tmp_path / "walk.txt"
+    TraceRenderer(FastGuard(sampleboard), trace, size=2).export(out, every=20)
+    frames = out.read_text().split("\n\n")
+    assert [f.splitlines()[0] for f in frames if f] == ["step 0", "step 20", "step 40", "step 44"]
+
+def test_batch_march_matches_march(sampleboard):
+    looped = [row.copy() for row in sampleboard]
+    looped[6][3] = '#'
+    trapped = [['.'] * 10 for _ in range(10)]
+    trapped[4][4] = '^'
+    for r, c in ((3, 4), (5, 4), (4, 3), (4, 5)):
+        trapped[r][c] = '#'
+    counts, reasons = batch_march([sampleboard, looped, trapped])
+    assert counts[0] == 41
+    assert [termination_reasons[r] for r in reasons] == ["exited", "looped", "trapped"]
+    random_boards = [_random_board(12, 0.15, seed) for seed in range(10)]
+    counts, reasons = batch_march(random_boards)
+    for board, count, reason in zip(random_boards, counts, reasons):
+        assert reason == 0
+        assert count == FastGuard(board).march(limit=145)
+
+def test_batch_march_starts(sampleboard):
+    starts = [(6, 4), (0, 0), (9, 9), (5, 5)]
+    counts, reasons = batch_march([sampleboard] * 4, starts)
+    for (row, col), count, reason in zip(starts, counts, reasons):
+        board = [r.copy() for r in sampleboard]
+        board[6][4] = '.'
+        board[row][col] = '^'
+        expected = FastGuard(board).march(limit=101)
+        assert termination_reasons[reason] == ("looped" if expected is None else "exited")
+        if expected is not None:
+            assert count == expected
+
+def test_batch_march_long_runs():
+    # runs across many visited bytes, and rows narrower than one byte
+    boards = [_spiral_board(40), _spiral_board(41, gap=2)]
+    boards += [_random_board(6, 0.2, seed) for seed in range(20)]
+    for batch in (boards[:1], boards[1:2], boards[2:]):
+        counts, reasons = batch_march(batch)
+        for board, count, reason in zip(batch, counts, reasons):
+            size = len(board) * len(board[0])
+            try:
+                expected = FastGuard(board).march(limit=size + 1)
+            except MapError:
+                assert termination_reasons[reason] == "trapped"
+                continue
+            assert termination_reasons[reason] == ("looped" if expected is None else "exited")
+            if expected is not None:
+                assert count == expected
@@ -0,0 +1,121 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+root = Path(__file__).resolve().parent
+parts = ("part_one", "part_two")
+
+def discover(base=root):
+    # every NN_YYYY/solution.py exposing parse/part_one/part_two is a day
+    return sorted(p.parent for p in Path(base).glob("*/solution.py"))
+
+_modules = {}
+
+def _load(day_dir):
+    # day modules all share the name "solution", so key them by directory
+    day_dir = Path(day_dir)
+    if day_dir not in _modules:
+        spec = importlib.util.spec_from_file_location(
+            f"solution_{day_dir.name}", day_dir / "solution.py",
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[day_dir] = module
+    return _modules[day_dir]
+
+def _error(e):
+    return f"{type(e).__name__}: {e}"
+
+def _run_day(job):
+    """Parse one day's input once, then solve each part, timing every stage"""
+    day_dir, input_name = job
+    day_dir = Path(day_dir)
+    # relative inputs live next to the day's solution, absolute ones are used as-is
+    src = day_dir / input_name
+    entry = {"day": day_dir.name, "input": str(src)}
+    try:
+        module = _load(day_dir)
+        t0 = perf_counter()
+        data = module.parse(str(src))
+        entry["parse_seconds"] = round(perf_counter() - t0, 6)
+    except Exception as e:
+        entry["error"] = _error(e)
+        return entry
+    for part in parts:
+        try:
+            t0 = perf_counter()
+            answer = getattr(module, part)(data)
+            entry[part] = {"answer": answer, "solve_seconds": round(perf_counter() - t0, 6)}
+        except Exception as e:
+            entry[part] = {"error": _error(e)}
+    return entry
+
+def _failed(entry):
+    return "error" in entry or any("error" in entry.get(part, {}) for part in parts)
+
+def run(days=None, input_name="data.txt", workers=None):
+    day_dirs = discover()
+    if days:
+        day_dirs = [d for d in day_dirs if d.name in days or d.name[:2] in days]
+    jobs = [(str(d), input_name) for d in day_dirs]
+    t0 = perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_run_day, jobs))
+    return {"results": results, "wall_seconds": round(perf_counter() - t0, 6)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="run every day's solution in parallel")
+    parser.add_argument("days", nargs="*", help="day directories or numbers, e.g. 01 06_2024")
+    parser.add_argument("--input", default="data.txt", help="input file name or absolute path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    report = run(args.days, args.input, args.workers)
+    print(json.dumps(report, indent=2, default=int))
+    return 1 if any(_failed(r) for r in report["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+# TESTS
+# ----------------------------------------------------------------------------------------------------------------------
+
+def test_discover():
+    day_dirs = discover()
+    assert day_dirs
+    for day_dir in day_dirs:
+        module = _load(day_dir)
+        assert all(callable(getattr(module, name, None)) for name in ("parse",) + parts)
+
+def test_run_day(tmp_path):
+    sample = "\n".join([
+        "....#.....",
+        ".........#",
+        "..........",
+        "..#.......",
+        ".......#..",
+        "..........",
+        ".#..^.....",
+        "........#.",
+        "#.........",
+        "......#...",
+    ])
+    src = tmp_path / "sample.txt"
+    src.write_text(sample + "\n")
+    day_dir = root / "06_2024"
+    entry = _run_day((str(day_dir), str(src)))
+    assert [entry[part]["answer"] for part in parts] == [41, 6]
+    assert entry["parse_seconds"] >= 0
+    assert all(entry[part]["solve_seconds"] >= 0 for part in parts)
+    assert not _failed(entry)
+
+def test_run_day_missing_input(tmp_path):
+    entry = _run_day((str(root / "01_2024"), str(tmp_path / "nope.txt")))
+    assert entry["error"].startswith("FileNotFoundError")
+    assert not any(part in entry for part in parts)
+    assert _failed(entry)